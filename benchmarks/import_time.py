@@ -0,0 +1,60 @@
+"""Startup benchmark for the pytubepp CLI fast path.
+
+Runs `python -X importtime` against `pytubepp.main` and the `pytubepp -v` command,
+reports the median import and wall time, and fails (exit code 1) when a heavy
+dependency is imported at startup or the import time exceeds the budget.
+
+Usage: python benchmarks/import_time.py [--runs 5] [--budget-ms 150]
+"""
+import argparse, statistics, subprocess, sys, time
+
+# Modules that must only be imported on the code paths that need them
+HEAVY_MODULES = ['pytubefix', 'requests', 'urllib3', 'aiohttp', 'rich', 'tqdm', 'tabulate', 'ffmpy']
+
+VERSION_COMMAND = "import sys; from pytubepp.main import main; sys.argv = ['pytubepp', '-v']; main()"
+
+def run_importtime(code):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+def heavy_imports(modules):
+    return sorted({name for name in modules if name.split('.')[0] in HEAVY_MODULES})
+
+def main():
+    parser = argparse.ArgumentParser(description='pytubepp startup benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='number of runs to take the median of (default: 5)')
+    parser.add_argument('--budget-ms', type=float, default=150, help='maximum allowed import time of pytubepp.main in milliseconds (default: 150)')
+    args = parser.parse_args()
+
+    import_times, wall_times = [], []
+    for _ in range(args.runs):
+        import_times.append(run_importtime('import pytubepp.main')['pytubepp.main'] / 1000)
+        start = time.perf_counter()
+        version_modules = run_importtime(VERSION_COMMAND)
+        wall_times.append((time.perf_counter() - start) * 1000)
+
+    import_ms = statistics.median(import_times)
+    wall_ms = statistics.median(wall_times)
+    print(f'import pytubepp.main: {import_ms:.1f} ms (median of {args.runs})')
+    print(f'pytubepp -v: {wall_ms:.1f} ms wall (median of {args.runs}, includes interpreter startup)')
+
+    failed = False
+    heavy = heavy_imports(version_modules)
+    if heavy:
+        print(f'FAIL: heavy modules imported by pytubepp -v: {", ".join(heavy)}')
+        failed = True
+    if import_ms > args.budget_ms:
+        print(f'FAIL: import time {import_ms:.1f} ms exceeds the budget of {args.budget_ms:.0f} ms')
+        failed = True
+    if not failed:
+        print('OK')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
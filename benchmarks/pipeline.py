@@ -0,0 +1,340 @@
+"""Offline end-to-end benchmark of the pytubepp download pipeline.
+
+Serves synthetic streams (generated once with ffmpeg) from a local HTTP server that honours the
+googlevideo range query parameter, stubs pytubefix.YouTube with a fixture manifest, and runs every
+scenario in a fresh process. Reports wall time, throughput, peak RSS (pytubepp and the ffmpeg processes
+it runs) and peak temporary disk usage, and compares the median wall time of every scenario against a
+baseline file (exit code 1 when a scenario is slower than the baseline by more than the tolerance, or
+when the baseline was saved with other --duration/--connections settings).
+
+Timings depend on the machine, so the baseline is not part of the repository: save one on your machine
+before doing the changes (python benchmarks/pipeline.py --save-baseline), then run it again after them.
+
+Scenarios: progressive (download_progressive), nonprogressive (download_nonprogressive),
+merge (download_nonprogressive + merge_audio_video), stream_merge (stream_merge_audio_video),
+mp3 (download_audio + convert_to_mp3), raw_info (the pytubepp <url> -ri command)
+
+Usage: python benchmarks/pipeline.py [--runs 3] [--duration 60] [--connections 4] [--scenarios merge,mp3]
+                                     [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 25]
+
+Requires ffmpeg in PATH, no network access is used.
+"""
+import argparse, contextlib, importlib, json, os, resource, shutil, statistics, subprocess, sys, tempfile, threading, time
+
+SCENARIOS = ['progressive', 'nonprogressive', 'merge', 'stream_merge', 'mp3', 'raw_info']
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+VIDEO_ID = 'bEnChMaRk01'
+
+# Fixture manifest of the fake video, every stream is served from its fixture file
+MANIFEST = {
+    'title': 'Benchmark Video',
+    'author': 'PytubePP',
+    'views': 1000,
+    'streams': [
+        {'itag': 18, 'file': 'progressive.mp4', 'mime_type': 'video/mp4', 'resolution': '360p', 'fps': 30, 'video_codec': 'avc1.42001E', 'audio_codec': 'mp4a.40.2', 'abr': '96kbps', 'is_adaptive': False, 'includes_video_track': True},
+        {'itag': 136, 'file': 'video.mp4', 'mime_type': 'video/mp4', 'resolution': '720p', 'fps': 30, 'video_codec': 'avc1.4d401f', 'audio_codec': None, 'abr': None, 'is_adaptive': True, 'includes_video_track': True},
+        {'itag': 140, 'file': 'audio.mp4', 'mime_type': 'audio/mp4', 'resolution': None, 'fps': None, 'video_codec': None, 'audio_codec': 'mp4a.40.2', 'abr': '128kbps', 'is_adaptive': True, 'includes_video_track': False},
+    ]
+}
+
+def generate_fixtures(fixtures_dir, duration):
+    """Generate the synthetic stream files once (regenerated when the duration changes)"""
+    stamp_file = os.path.join(fixtures_dir, 'duration')
+    stamp = f'{duration} dash'
+    if os.path.isfile(stamp_file) and open(stamp_file).read() == stamp:
+        return
+    os.makedirs(fixtures_dir, exist_ok=True)
+    print(f'Generating {duration}s fixtures with ffmpeg...')
+    # Adaptive streams are fragmented like YouTube's DASH streams, so they can be read from a pipe (stream_merge)
+    dash = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+    commands = [
+        ['-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={duration}', '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '4M', '-an'] + dash + ['video.mp4'],
+        ['-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={duration}', '-c:a', 'aac', '-b:a', '128k'] + dash + ['audio.mp4'],
+        ['-i', 'video.mp4', '-i', 'audio.mp4', '-c', 'copy', 'progressive.mp4'],
+        ['-f', 'lavfi', '-i', 'testsrc2=size=1280x720', '-frames:v', '1', 'maxresdefault.jpg'],
+    ]
+    for command in commands:
+        subprocess.run(['ffmpeg', '-y', '-v', 'error'] + command, cwd=fixtures_dir, check=True)
+    with open(stamp_file, 'w') as f:
+        f.write(stamp)
+
+def start_server(fixtures_dir):
+    """Fake googlevideo/ytimg server: /<fixture file>?range=<start>-<end>, thumbnails by their file name"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlsplit, parse_qs
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            file_path = os.path.join(fixtures_dir, os.path.basename(url.path))
+            if not os.path.isfile(file_path):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            size = os.path.getsize(file_path)
+            start, end = 0, size - 1
+            if 'range' in parse_qs(url.query):
+                start, end = map(int, parse_qs(url.query)['range'][0].split('-'))
+                end = min(end, size - 1)
+            self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+            with open(file_path, 'rb') as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining:
+                    chunk = f.read(min(remaining, 1048576))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+class FakeStream:
+    def __init__(self, entry, base_url, fixtures_dir):
+        self.__dict__.update({key: value for key, value in entry.items() if key != 'file'})
+        self.url = f"{base_url}/{entry['file']}?id={VIDEO_ID}&itag={entry['itag']}"
+        self.filesize = os.path.getsize(os.path.join(fixtures_dir, entry['file']))
+        self.bitrate = 4194304 if entry['includes_video_track'] else 131072
+        self.is_sabr = False
+        self.is_progressive = not entry['is_adaptive']
+
+    def __repr__(self):
+        return f'<Stream: itag="{self.itag}" mime_type="{self.mime_type}" res="{self.resolution}">'
+
+class FakeStreamQuery(list):
+    def get_by_itag(self, itag):
+        return next((stream for stream in self if stream.itag == itag), None)
+
+    def filter(self, **kwargs):
+        return FakeStreamQuery(stream for stream in self if all(getattr(stream, key) == value for key, value in kwargs.items()))
+
+def make_fake_youtube(base_url, fixtures_dir, duration):
+    class FakeYouTube:
+        def __init__(self, url, on_progress_callback=None, **kwargs):
+            self.video_id = VIDEO_ID
+            self.title = MANIFEST['title']
+            self.author = MANIFEST['author']
+            self.views = MANIFEST['views']
+            self.length = duration
+            self.publish_date = None
+            self.thumbnail_url = f'{base_url}/vi/{VIDEO_ID}/hqdefault.jpg'
+            self.captions = {}
+            self.streams = FakeStreamQuery(FakeStream(entry, base_url, fixtures_dir) for entry in MANIFEST['streams'])
+    return FakeYouTube
+
+def disk_usage(path):
+    # Allocated blocks rather than apparent sizes, as segmented downloads preallocate sparse files
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.stat(os.path.join(root, file)).st_blocks * 512
+            except OSError:
+                pass
+    return total
+
+class MeasuredPopen(subprocess.Popen):
+    """Popen that follows the peak RSS (VmHWM) of the ffmpeg processes it starts. Neither RUSAGE_CHILDREN nor os.wait4
+    can measure it, Linux carries the peak RSS of the forked python process over to the program it executes"""
+    peak_rss = None
+
+    def __init__(self, args, *popen_args, **kwargs):
+        super().__init__(args, *popen_args, **kwargs)
+        if os.path.basename(str(args[0])).startswith('ffmpeg'):
+            threading.Thread(target=self.follow_rss, daemon=True).start()
+
+    def follow_rss(self):
+        # VmHWM is a high-water mark, only the growth after the last sample before ffmpeg exits can be missed
+        while True:
+            try:
+                with open(f'/proc/{self.pid}/status') as f:
+                    peak = next((int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:')), None)
+            except OSError:
+                peak = None
+            if peak is None:
+                return
+            MeasuredPopen.peak_rss = max(MeasuredPopen.peak_rss or 0, peak)
+            time.sleep(0.005)
+
+def run_scenario(name, workdir, base_url, fixtures_dir, duration, connections):
+    """Worker side: run one scenario in this (fresh) process and return its measurements"""
+    # Before ffmpy is imported, it keeps its own reference to Popen
+    subprocess.Popen = MeasuredPopen
+    import pytubefix
+    FakeYouTube = make_fake_youtube(base_url, fixtures_dir, duration)
+    pytubefix.YouTube = FakeYouTube
+    from pytubepp.download import download_progressive, download_nonprogressive, download_audio
+    from pytubepp.postprocess import merge_audio_video, stream_merge_audio_video, convert_to_mp3
+    temp_dir, output_dir = os.path.join(workdir, 'staging'), os.path.join(workdir, 'downloads')
+    streams = FakeYouTube(VIDEO_ID).streams
+    sizes = {stream.itag: stream.filesize for stream in streams}
+
+    def progressive():
+        download_progressive(streams, 18, 'bench', '360p', 'mp4', {}, None, temp_dir, output_dir, connections, VIDEO_ID)
+        return sizes[18]
+
+    def nonprogressive():
+        download_nonprogressive(streams, 136, 140, 'mp4', temp_dir, connections, VIDEO_ID)
+        return sizes[136] + sizes[140]
+
+    def merge():
+        merge_audio_video('bench', '720p', 'mp4', download_nonprogressive(streams, 136, 140, 'mp4', temp_dir, connections, VIDEO_ID), {}, None, temp_dir, output_dir, VIDEO_ID)
+        return sizes[136] + sizes[140]
+
+    def stream_merge():
+        stream_merge_audio_video(streams, 136, 140, 'bench', '720p', 'mp4', {}, None, temp_dir, output_dir, connections, VIDEO_ID)
+        return sizes[136] + sizes[140]
+
+    def mp3():
+        convert_to_mp3('bench', FakeYouTube(VIDEO_ID).thumbnail_url, download_audio(streams, 140, temp_dir, connections, VIDEO_ID), 'PytubePP', 'bench', 'PytubePP', temp_dir, output_dir, VIDEO_ID)
+        return sizes[140] + os.path.getsize(os.path.join(fixtures_dir, 'maxresdefault.jpg'))
+
+    def raw_info():
+        cli = importlib.import_module('pytubepp.main')
+        sys.argv = ['pytubepp', f'https://www.youtube.com/watch?v={VIDEO_ID}', '-ri']
+        cli.main()
+        return 0
+
+    peak_disk = [0]
+    sampling = threading.Event()
+
+    def sample_disk():
+        while not sampling.wait(0.01):
+            peak_disk[0] = max(peak_disk[0], disk_usage(temp_dir))
+
+    sampler = threading.Thread(target=sample_disk, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    transferred = {'progressive': progressive, 'nonprogressive': nonprogressive, 'merge': merge, 'stream_merge': stream_merge, 'mp3': mp3, 'raw_info': raw_info}[name]()
+    wall = time.perf_counter() - start
+    sampling.set()
+    sampler.join()
+    peak_disk[0] = max(peak_disk[0], disk_usage(temp_dir))
+    return {
+        'wall': wall,
+        'bytes': transferred,
+        'throughput': transferred / wall if transferred else None,
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'ffmpeg_rss': MeasuredPopen.peak_rss,
+        'temp_disk': peak_disk[0]
+    }
+
+def prepare_run_environment(workdir):
+    # Every run starts cold: empty caches, staging and download folders, no network or update checks
+    shutil.rmtree(workdir, ignore_errors=True)
+    config_dir = os.path.join(workdir, 'config', 'pytubepp')
+    for path in [config_dir, os.path.join(workdir, 'cache'), os.path.join(workdir, 'staging'), os.path.join(workdir, 'downloads')]:
+        os.makedirs(path, exist_ok=True)
+    with open(os.path.join(config_dir, 'config.json'), 'w') as f:
+        json.dump({'downloadDIR': os.path.join(workdir, 'downloads'), 'stagingDIR': os.path.join(workdir, 'staging'), 'networkCheck': False, 'updateCheck': False}, f)
+    return dict(os.environ, XDG_CONFIG_HOME=os.path.join(workdir, 'config'), XDG_CACHE_HOME=os.path.join(workdir, 'cache'), PYTUBEPP_NO_UPDATE_CHECK='1')
+
+def format_size(size):
+    return f'{size / 1048576:.1f} MB' if size is not None else '-'
+
+def main():
+    parser = argparse.ArgumentParser(description='pytubepp offline pipeline benchmark')
+    parser.add_argument('--runs', type=int, default=3, help='number of runs of every scenario to take the median of (default: 3)')
+    parser.add_argument('--duration', type=int, default=60, help='duration of the synthetic video in seconds, about 0.5 MB per second (default: 60)')
+    parser.add_argument('--connections', type=int, default=4, help='connections per stream (default: 4)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'comma separated scenarios to run (default: {",".join(SCENARIOS)})')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'pytubepp-benchmark'), help='folder for fixtures and run files')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file to compare against (default: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=25, help='allowed wall time regression against the baseline in percent (default: 25)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    fixtures_dir = os.path.join(args.workdir, 'fixtures')
+
+    if args.worker:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = run_scenario(args.worker, os.path.join(args.workdir, 'run'), args.base_url, fixtures_dir, args.duration, args.connections)
+        with open(args.result_file, 'w') as f:
+            json.dump(result, f)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(unknown)}')
+    if not shutil.which('ffmpeg'):
+        print('FAIL: ffmpeg not found in PATH')
+        sys.exit(1)
+
+    baseline = {}
+    if not args.save_baseline:
+        if not os.path.isfile(args.baseline):
+            print(f'No baseline found at {args.baseline}, save one with --save-baseline before doing the changes')
+        else:
+            with open(args.baseline) as f:
+                saved = json.load(f)
+            if (saved.get('duration'), saved.get('connections')) != (args.duration, args.connections):
+                print(f'FAIL: the baseline was saved with --duration {saved.get("duration")} --connections {saved.get("connections")}, '
+                      f'run with the same settings or save a new baseline')
+                sys.exit(1)
+            baseline = saved.get('results', {})
+
+    generate_fixtures(fixtures_dir, args.duration)
+    server, base_url = start_server(fixtures_dir)
+    result_file = os.path.join(args.workdir, 'result.json')
+    results = {}
+    try:
+        for name in scenarios:
+            runs = []
+            for _ in range(args.runs):
+                env = prepare_run_environment(os.path.join(args.workdir, 'run'))
+                subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', name, '--base-url', base_url, '--result-file', result_file,
+                                '--workdir', args.workdir, '--duration', str(args.duration), '--connections', str(args.connections)],
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+                with open(result_file) as f:
+                    runs.append(json.load(f))
+            throughputs = [run['throughput'] for run in runs if run['throughput']]
+            results[name] = {
+                'wall': statistics.median(run['wall'] for run in runs),
+                'throughput': statistics.median(throughputs) if throughputs else None,
+                'rss': max(run['rss'] for run in runs),
+                'ffmpeg_rss': max((run['ffmpeg_rss'] for run in runs if run['ffmpeg_rss']), default=None),
+                'temp_disk': max(run['temp_disk'] for run in runs)
+            }
+    finally:
+        server.shutdown()
+
+    failed = False
+    print(f'{"scenario":<16}{"wall":>10}{"vs baseline":>13}{"throughput":>14}{"peak rss":>11}{"ffmpeg rss":>12}{"temp disk":>11}')
+    for name, result in results.items():
+        comparison = '-'
+        if name in baseline:
+            change = (result['wall'] - baseline[name]['wall']) * 100 / baseline[name]['wall']
+            comparison = f'{change:+.1f}%'
+            if change > args.tolerance:
+                comparison += ' !!'
+                failed = True
+        throughput = f'{format_size(result["throughput"])}/s' if result['throughput'] else '-'
+        print(f'{name:<16}{result["wall"]:>9.3f}s{comparison:>13}{throughput:>14}{format_size(result["rss"]):>11}{format_size(result["ffmpeg_rss"]):>12}{format_size(result["temp_disk"]):>11}')
+    print(f'(median of {args.runs} runs, {args.duration}s fixtures, {args.connections} connections per stream)')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'duration': args.duration, 'connections': args.connections, 'runs': args.runs, 'results': results}, f, indent=4)
+        print(f'Baseline saved to {args.baseline}')
+    elif failed:
+        print(f'FAIL: wall time regressed by more than {args.tolerance:.0f}% against the baseline')
+    elif baseline:
+        print('OK')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,216 @@
+from .config import load_config
+from .utils import get_unique_filename, postprocess_cleanup, finalize_output_file, save_job, remove_job, is_valid_url
+from .download import load_journal, save_journal, get_missing_segments, get_temp_filename, download_with_progress, cancel_event, DownloadCancelled, in_context, get_thumbnail_urls, use_cached_thumbnail, save_thumbnail
+from .postprocess import get_mp3_output_args, get_output_file
+from .subtitles import prepare_caption, get_caption_suffixes
+from .archive import record_download
+from .ratelimit import reserve
+from .metrics import span, count_bytes
+import asyncio, os, subprocess
+
+# asyncio download engine: every transfer of a process runs on one event loop and one aiohttp connection pool,
+# so hundreds of in-flight downloads cost no more than a thread each. pytubefix itself is blocking, so
+# resolving videos and caption downloads still run in the default executor
+
+def create_session(limit=100):
+    import aiohttp
+    timeout = load_config()['httpTimeout']
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit), timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout))
+
+async def run_in_thread(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, in_context(fn), *args)
+
+async def transferred_async(amount):
+    event = cancel_event.get()
+    if event is not None and event.is_set():
+        raise DownloadCancelled('Download cancelled')
+    count_bytes(amount)
+    wait = reserve(amount)
+    if wait:
+        await asyncio.sleep(wait)
+
+async def fetch_segmented_async(session, url, filesize, file_path, progress_bar, connections=1, segment_size=None, max_retries=3):
+    """Async version of download_segmented, sharing its .part file and journal format (so both engines resume each other)"""
+    import aiohttp
+    from yarl import URL
+    if os.path.isfile(file_path) and os.path.getsize(file_path) == filesize:
+        progress_bar.update(filesize)
+        return
+
+    segment_size = segment_size or load_config()['segmentSize']
+    part_file = file_path + '.part'
+    journal_file = part_file + '.json'
+
+    completed = load_journal(journal_file, filesize) if os.path.isfile(part_file) else []
+    if not completed:
+        with open(part_file, 'wb') as file:
+            file.truncate(filesize)
+        save_journal(journal_file, filesize, completed)
+    progress_bar.update(sum(end - start + 1 for start, end in completed))
+    semaphore = asyncio.Semaphore(connections)
+
+    async def fetch_segment(file, segment):
+        start, end = segment
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                received = 0
+                try:
+                    # Signed stream urls must reach the server exactly as they are, without re-encoding
+                    async with session.get(URL(f"{url}{'&' if '?' in url else '?'}range={start}-{end}", encoded=True)) as response:
+                        response.raise_for_status()
+                        async for chunk in response.content.iter_chunked(65536):
+                            # Seek and write happen without a suspension point in between, so segments never interleave
+                            file.seek(start + received)
+                            file.write(chunk)
+                            received += len(chunk)
+                            progress_bar.update(len(chunk))
+                            await transferred_async(len(chunk))
+                    if received == end - start + 1:
+                        completed.append(segment)
+                        save_journal(journal_file, filesize, completed)
+                        return
+                    error = IOError(f'Incomplete segment {start}-{end} ({received} of {end - start + 1} bytes)')
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                progress_bar.update(-received)
+            raise error
+
+    with open(part_file, 'r+b') as file:
+        tasks = [asyncio.ensure_future(fetch_segment(file, segment)) for segment in get_missing_segments(completed, filesize, segment_size)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    os.replace(part_file, file_path)
+    os.remove(journal_file)
+
+async def download_stream_async(session, selected_stream, output_path, filename, progress_bar, connections=1):
+    # SABR streams can't be fetched by byte ranges, so they go through the blocking pytubefix download in a thread
+    if getattr(selected_stream, 'is_sabr', False) or not selected_stream.filesize:
+        await run_in_thread(download_with_progress, selected_stream, output_path, filename, 'Downloading', 0, connections)
+        return
+    progress_bar.total = (progress_bar.total or 0) + selected_stream.filesize
+    progress_bar.refresh()
+    with span('transfer', file=filename, itag=selected_stream.itag, size=selected_stream.filesize, connections=connections):
+        await fetch_segmented_async(session, selected_stream.url, selected_stream.filesize, os.path.join(output_path, filename), progress_bar, connections)
+
+async def download_thumbnail_async(session, url, file_path, video_id=None):
+    import aiohttp
+    if use_cached_thumbnail(video_id, file_path):
+        return True
+
+    async def fetch_variant(thumbnail_url):
+        try:
+            async with session.get(thumbnail_url) as response:
+                if response.status != 200:
+                    return None
+                image = await response.read()
+                await transferred_async(len(image))
+                return image or None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    with span('thumbnail', video_id=video_id):
+        images = await asyncio.gather(*[fetch_variant(thumbnail_url) for thumbnail_url in get_thumbnail_urls(url)])
+    return save_thumbnail(video_id, images, file_path)
+
+async def run_ffmpeg_async(inputs, output_file, output_args):
+    # ffmpy can only wait on ffmpeg by blocking, so the command is run as an asyncio subprocess instead
+    command = ['ffmpeg', '-y']
+    for input_file in inputs:
+        command += ['-i', input_file]
+    with span('ffmpeg', output=os.path.basename(output_file)):
+        process = await asyncio.create_subprocess_exec(*command, *output_args, output_file, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            returncode = await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+    if returncode != 0:
+        raise RuntimeError(f'ffmpeg exited with status {returncode}')
+
+async def download_candidate_async(session, downloader, link, resolved, candidate, caption_code=None, progress_bar=None):
+    """Download and post-process a stream candidate of a resolved video on the event loop, returns the output file path"""
+    from tqdm import tqdm
+    video_id = resolved['video'].video_id
+    video_stream, audio_stream, file_extention = candidate['video'], candidate['audio'], candidate['ext']
+    tempDIR, downloadDIR = downloader.temp_dir, downloader.download_dir
+    bar = progress_bar or tqdm(total=0, unit='B', unit_scale=True, desc='Downloading')
+    save_job(video_id, link, candidate['res'], caption_code)
+
+    try:
+        with span('job', video_id=video_id, stream=candidate['res'], caption=caption_code):
+            if candidate['res'] == 'mp3':
+                random_filename = get_temp_filename(video_id, audio_stream.itag)
+                audio_file = os.path.join(tempDIR, random_filename + '_ado.mp4')
+                image_file = os.path.join(tempDIR, random_filename + '_thumbnail.jpg')
+                _, has_cover = await asyncio.gather(
+                    download_stream_async(session, audio_stream, tempDIR, random_filename + '_ado.mp4', bar, downloader.connections),
+                    download_thumbnail_async(session, resolved['thumbnail'], image_file, video_id))
+                output_file = os.path.join(downloadDIR, get_unique_filename(resolved['title'] + '_audio.mp3', downloadDIR))
+                # The audio is still exported when no thumbnail is available, just without cover art
+                output_args = get_mp3_output_args(resolved['author'], resolved['video'].title, resolved['author'], has_cover)
+                inputs, cleanup = [audio_file, image_file] if has_cover else [audio_file], ['_thumbnail.jpg', '_ado.mp4', '_merged.mp3']
+                output_temp_file = os.path.join(tempDIR, random_filename + '_merged.mp3')
+            else:
+                random_filename = get_temp_filename(video_id, video_stream.itag)
+                video_file = os.path.join(tempDIR, random_filename + '_vdo.' + file_extention)
+                audio_file = os.path.join(tempDIR, random_filename + '_ado.' + file_extention)
+                if candidate['progressive']:
+                    await download_stream_async(session, video_stream, tempDIR, os.path.basename(video_file), bar, downloader.connections)
+                    inputs = [video_file]
+                else:
+                    await asyncio.gather(
+                        download_stream_async(session, video_stream, tempDIR, os.path.basename(video_file), bar, downloader.connections),
+                        download_stream_async(session, audio_stream, tempDIR, os.path.basename(audio_file), bar, downloader.connections))
+                    inputs = [video_file, audio_file]
+                output_file = get_output_file(resolved['title'], candidate['label'], file_extention, caption_code, downloadDIR)
+                output_args = await run_in_thread(prepare_caption, resolved['captions'], caption_code, tempDIR, random_filename, file_extention, video_id, len(inputs)) if caption_code else ['-c:v', 'copy', '-c:a', 'copy']
+                cleanup = ['_vdo.' + file_extention, '_ado.' + file_extention, '_merged.' + file_extention] + get_caption_suffixes(caption_code)
+                output_temp_file = os.path.join(tempDIR, random_filename + '_merged.' + file_extention)
+
+            if candidate['progressive'] and not caption_code:
+                # Nothing to mux, the downloaded stream already is the output file
+                output_file = await run_in_thread(finalize_output_file, video_file, output_file)
+            else:
+                await run_ffmpeg_async(inputs, output_temp_file, output_args)
+                output_file = await run_in_thread(finalize_output_file, output_temp_file, output_file)
+            postprocess_cleanup(tempDIR, cleanup, random_filename)
+    finally:
+        if not progress_bar:
+            bar.close()
+
+    remove_job(video_id)
+    record_download(video_id, candidate['res'], video_stream.itag if video_stream else None, audio_stream.itag, caption_code, output_file)
+    return output_file
+
+async def download_videos_async(downloader, urls, concurrency, chosen_stream=None, chosen_caption=None):
+    """Download many videos concurrently on one event loop and connection pool, returns a summary row per url (in order)"""
+    from tqdm import tqdm
+    semaphore = asyncio.Semaphore(concurrency)
+    progress_bar = tqdm(total=0, unit='B', unit_scale=True, desc='Downloading')
+
+    async def run_job(session, url):
+        async with semaphore:
+            try:
+                if not is_valid_url(url):
+                    raise ValueError('Invalid video link')
+                resolved = await run_in_thread(downloader.resolve_video, url)
+                stream, caption = downloader.choose_download(resolved, chosen_stream, chosen_caption)
+                output_file = await download_candidate_async(session, downloader, url, resolved, downloader.get_stream_candidate(stream, resolved['stream_index']), caption, progress_bar)
+                result = [url, stream, caption or 'none', 'Done', output_file]
+            except DownloadCancelled:
+                result = [url, chosen_stream or '-', chosen_caption or '-', 'Cancelled', '-']
+            except Exception as e:
+                result = [url, chosen_stream or '-', chosen_caption or '-', 'Failed', str(e) or e.__class__.__name__]
+            progress_bar.write(f'{result[3]}: {url}')
+            return result
+
+    try:
+        async with create_session(max(concurrency * downloader.connections, 1)) as session:
+            return await asyncio.gather(*[run_job(session, url) for url in urls])
+    finally:
+        progress_bar.close()
\ No newline at end of file
@@ -0,0 +1,52 @@
+from contextlib import closing
+import appdirs, os, sqlite3, time
+
+def get_archive_path():
+    config_dir = appdirs.user_config_dir('pytubepp')
+    os.makedirs(config_dir, exist_ok=True)
+    return os.path.join(config_dir, 'archive.db')
+
+def connect_archive():
+    connection = sqlite3.connect(get_archive_path(), timeout=30)
+    connection.execute('CREATE TABLE IF NOT EXISTS downloads (video_id TEXT NOT NULL, stream TEXT, video_itag INTEGER, audio_itag INTEGER, caption TEXT, output_path TEXT NOT NULL, size INTEGER, mtime REAL, downloaded_at REAL, PRIMARY KEY (video_id, output_path))')
+    return connection
+
+def record_download(video_id, stream, video_itag, audio_itag, caption, output_path):
+    try:
+        stat = os.stat(output_path)
+        with closing(connect_archive()) as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (video_id, stream, video_itag, audio_itag, caption, output_path, stat.st_size, stat.st_mtime, time.time()))
+    except (OSError, sqlite3.Error) as e:
+        print(f'\nUnable to update the download archive! ({e})')
+
+def matches_download(row_stream, row_caption, stream=None, caption=None):
+    # Stream: a resolution (eg: 720p, mp3), 'max' for any video stream or None for any stream
+    if stream == 'max' and row_stream == 'mp3' or stream not in [None, 'max'] and row_stream != stream:
+        return False
+    # Caption: caption codes (eg: en,a.fr), 'none' for no caption or None for any caption
+    if caption is not None and set((row_caption or 'none').split(',')) != set(caption.split(',')):
+        return False
+    return True
+
+def find_download(video_id, stream=None, caption=None, verify=True):
+    """Return the latest archived download of a video with the given stream and caption (see matches_download)
+    (None if it was never downloaded, or its file was deleted or changed when verifying)"""
+    try:
+        with closing(connect_archive()) as connection, connection:
+            rows = connection.execute('SELECT output_path, size, mtime, stream, caption FROM downloads WHERE video_id = ? ORDER BY downloaded_at DESC', (video_id,)).fetchall()
+            for output_path, size, mtime, row_stream, row_caption in rows:
+                if not matches_download(row_stream, row_caption, stream, caption):
+                    continue
+                if verify:
+                    try:
+                        stat = os.stat(output_path)
+                    except OSError:
+                        stat = None
+                    if not stat or stat.st_size != size or stat.st_mtime != mtime:
+                        # The file was deleted or replaced, so the video has to be downloaded again
+                        connection.execute('DELETE FROM downloads WHERE video_id = ? AND output_path = ?', (video_id, output_path))
+                        continue
+                return {'output_path': output_path, 'stream': row_stream, 'caption': row_caption}
+    except sqlite3.Error as e:
+        print(f'\nUnable to read the download archive! ({e})')
+    return None
\ No newline at end of file
@@ -0,0 +1,78 @@
+import os, json, time, appdirs
+
+def get_cache_directory(name):
+    cache_dir = os.path.join(appdirs.user_cache_dir('pytubepp'), name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def read_cache(name, key, ttl=None):
+    cache_file = os.path.join(get_cache_directory(name), key + '.json')
+    try:
+        with open(cache_file, 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if ttl is not None and time.time() - entry.get('cached_at', 0) > ttl:
+        return None
+
+    # Touch the entry so it counts as recently used for LRU eviction
+    try:
+        os.utime(cache_file)
+    except OSError:
+        pass
+    return entry.get('data')
+
+def write_cache(name, key, data, max_entries=None, max_bytes=None):
+    cache_dir = get_cache_directory(name)
+    cache_file = os.path.join(cache_dir, key + '.json')
+    temp_file = cache_file + '.tmp'
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump({'cached_at': time.time(), 'data': data}, f)
+        os.replace(temp_file, cache_file)
+    except OSError:
+        return
+    evict_cache(name, max_entries, max_bytes)
+
+def evict_cache(name, max_entries=None, max_bytes=None):
+    cache_dir = get_cache_directory(name)
+    entries = []
+    for file in os.listdir(cache_dir):
+        file_path = os.path.join(cache_dir, file)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, file_path))
+
+    # Least recently used entries are removed first
+    entries.sort()
+    total_bytes = sum(entry[1] for entry in entries)
+    while entries and ((max_entries is not None and len(entries) > max_entries) or (max_bytes is not None and total_bytes > max_bytes)):
+        _, size, file_path = entries.pop(0)
+        try:
+            os.remove(file_path)
+            total_bytes -= size
+        except OSError:
+            pass
+
+def read_cache_file(name, filename):
+    # Binary entries (eg: thumbnails) are stored as plain files, returns the path of the entry (None on a miss)
+    cache_file = os.path.join(get_cache_directory(name), filename)
+    try:
+        os.utime(cache_file)
+    except OSError:
+        return None
+    return cache_file
+
+def write_cache_file(name, filename, data, max_entries=None, max_bytes=None):
+    cache_file = os.path.join(get_cache_directory(name), filename)
+    temp_file = cache_file + '.tmp'
+    try:
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, cache_file)
+    except OSError:
+        return
+    evict_cache(name, max_entries, max_bytes)
\ No newline at end of file
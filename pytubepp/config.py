@@ -1,4 +1,4 @@
-import os, json, platform, appdirs, tempfile
+import os, json, platform, appdirs
 
 def get_download_folder():
     system = platform.system()
@@ -12,25 +12,68 @@ def get_download_folder():
         return cli_download_dir
     
 DEFAULT_CONFIG = {
-    'downloadDIR': get_download_folder(),
+    'downloadDIR': None,  # resolved by load_config() (see get_download_folder)
+    'stagingDIR': None,  # defaults to a hidden folder inside downloadDIR (see get_temporary_directory)
     'defaultStream': 'max',
     'defaultCaption': 'none',
+    'infoCacheTTL': 86400,
+    'infoCacheSize': 500,
+    'thumbnailCacheSize': 52428800,
+    'captionCacheSize': 500,
+    'connections': 1,
+    'segmentSize': 9437184,  # range size pytubefix uses, googlevideo throttles larger ranges
+    'maxRate': None,
+    'httpPoolSize': 32,
+    'httpTimeout': 30,
+    'httpRetries': 3,
+    'sharedRateLimit': False,
+    'streamingMux': False,
+    'asyncEngine': False,
+    'resolveWorkers': 8,
+    'muxWorkers': 2,
+    'pipelineBuffer': 2,
+    'skipExisting': False,
+    'archiveVerify': True,
+    'tempExpiry': 7,
+    'networkCheck': True,
+    'serveAddress': '127.0.0.1:8765',
+    'serveJobTTL': 3600,
+    'serveMaxJobs': 1000,
+    'updateCheck': True,
+    'updateCheckInterval': 86400,
 }
+
+# Config is loaded once per process and shared by every module
+user_config = None
     
-def get_temporary_directory():
-    temp_dir = tempfile.gettempdir()
-    cli_temp_dir = os.path.join(temp_dir, 'pytubepp')
-    os.makedirs(cli_temp_dir, exist_ok=True)
+def get_temporary_directory(create=True):
+    # Staging on the same filesystem as the downloads lets finished files be moved into place with a rename instead of a copy
+    config = load_config()
+    cli_temp_dir = config['stagingDIR'] or os.path.join(config['downloadDIR'], '.pytubepp-staging')
+    if create:
+        os.makedirs(cli_temp_dir, exist_ok=True)
     return cli_temp_dir
 
-def load_config():
-    config_dir = appdirs.user_config_dir('pytubepp')
-    config_path = os.path.join(config_dir, 'config.json')
+def get_config_path():
+    return os.path.join(appdirs.user_config_dir('pytubepp'), 'config.json')
+
+def load_user_settings():
+    """Settings of config.json, without the defaults"""
+    config_path = get_config_path()
     if os.path.exists(config_path):
         with open(config_path, 'r') as f:
             return json.load(f)
-    else:
-        return DEFAULT_CONFIG
+    return {}
+
+def load_config():
+    global user_config
+    if user_config is None:
+        config = dict(DEFAULT_CONFIG)
+        config.update(load_user_settings())
+        if not config['downloadDIR']:
+            config['downloadDIR'] = get_download_folder()
+        user_config = config
+    return user_config
 
 def save_config(config):
     config_dir = appdirs.user_config_dir('pytubepp')
@@ -40,11 +83,15 @@ def save_config(config):
         json.dump(config, f, indent=4)
 
 def update_config(key, value):
-    config = load_config()
-    config[key] = value
-    save_config(config)
+    # Only the settings the user changed are written, the others keep following the defaults
+    settings = load_user_settings()
+    settings[key] = value
+    save_config(settings)
+    load_config()[key] = value
 
 def reset_config():
+    global user_config
+    user_config = None
     config_dir = appdirs.user_config_dir('pytubepp')
     config_path = os.path.join(config_dir, 'config.json')
     if os.path.exists(config_path):
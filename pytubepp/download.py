@@ -1,89 +1,343 @@
-from tqdm import tqdm
 from .config import get_temporary_directory, load_config
-from .utils import get_unique_filename, postprocess_cleanup, unpack_caption
-import os, re, requests, shutil, sys, random, ffmpy
+from .utils import get_unique_filename, postprocess_cleanup, finalize_output_file
+from .subtitles import prepare_caption, split_captions, get_caption_suffixes
+from .cache import read_cache_file, write_cache_file
+from .ratelimit import throttle
+from .session import http_get
+from .metrics import span, count_bytes
+import os, re, random, threading, json, errno, shutil, contextvars
 
-userConfig = load_config()
-downloadDIR = userConfig['downloadDIR']
-tempDIR = get_temporary_directory()
+# Cancel event of the daemon job running in the current context (see serve.py), it's None outside the daemon
+cancel_event = contextvars.ContextVar('cancel_event', default=None)
+# Stop events of the worker pools the current context runs in, one per nested pool (see run_workers)
+stop_events = contextvars.ContextVar('stop_events', default=())
+# Progress bar rows of the batch worker running in the current context, as (first row, label) (see download_videos_pipelined)
+progress_slot = contextvars.ContextVar('progress_slot', default=(0, None))
 
-def download_progressive(stream, itag, title, resolution, file_extention, captions, caption_code=None, tempDIR=tempDIR, downloadDIR=downloadDIR):
-    global total_filesize, progress_bar
+class DownloadCancelled(Exception):
+    pass
+
+def in_context(fn):
+    # Worker threads don't inherit the caller's context, so every call runs in a copy of it to keep the job it belongs to
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(fn, *args)
+
+def check_cancelled():
+    event = cancel_event.get()
+    if event is not None and event.is_set():
+        raise DownloadCancelled('Download cancelled')
+    if any(event.is_set() for event in stop_events.get()):
+        raise DownloadCancelled('Download stopped')
+
+def create_progress_bar(total, desc, position=0, initial=0):
+    from tqdm import tqdm
+    row, label = progress_slot.get()
+    return tqdm(total=total, initial=initial, unit='B', unit_scale=True, desc=f'{label}: {desc}' if label else desc, position=row + position)
+
+def transferred(amount):
+    """Called after every downloaded chunk, applies the rate limit and stops the transfer when its job was cancelled"""
+    check_cancelled()
+    count_bytes(amount)
+    throttle(amount)
+
+def download_progressive(stream, itag, title, resolution, file_extention, captions, caption_code=None, tempDIR=None, downloadDIR=None, connections=1, video_id=None):
+    import ffmpy
+    tempDIR = tempDIR or get_temporary_directory()
+    downloadDIR = downloadDIR or load_config()['downloadDIR']
     selected_vdo = stream.get_by_itag(itag)
-    total_filesize = selected_vdo.filesize
-    progress_bar = tqdm(total=total_filesize, unit='B', unit_scale=True, desc="Downloading Video+Audio")
-    random_filename = str(random.randint(1000000000, 9999999999))
+    random_filename = get_temp_filename(video_id, itag)
     filename = random_filename + '_vdo.' + file_extention
     output_temp_file = os.path.join(tempDIR, filename)
-    output_file = os.path.join(downloadDIR, get_unique_filename(title + '_' + resolution + '.' + file_extention)) if not caption_code else os.path.join(downloadDIR, get_unique_filename(title + '_' + resolution + '_' + caption_code + '.' + file_extention))
-    selected_vdo.download(output_path=tempDIR, filename=filename)
+    output_file = os.path.join(downloadDIR, get_unique_filename(title + '_' + resolution + '.' + file_extention)) if not caption_code else os.path.join(downloadDIR, get_unique_filename(title + '_' + resolution + '_' + '_'.join(split_captions(caption_code)) + '.' + file_extention))
+    download_with_progress(selected_vdo, tempDIR, filename, "Downloading Video+Audio", connections=connections)
 
     if caption_code:
-        print(f'Downloading Caption ({caption_code})...')
-        caption = captions[caption_code]
-        _, caption_lang = unpack_caption(caption)
-        caption_file = os.path.join(tempDIR, random_filename + '_cap.srt')
-        caption.save_captions(caption_file)
+        output_args = prepare_caption(captions, caption_code, tempDIR, random_filename, file_extention, video_id, media_inputs=1)
         print('Processing...')
         devnull = open(os.devnull, 'w')
         output_temp_file_with_subs = os.path.join(tempDIR, random_filename + '_merged.' + file_extention)
         ff = ffmpy.FFmpeg(
+            global_options=['-y'],
             inputs={output_temp_file: None},
-            outputs={output_temp_file_with_subs: ['-i', caption_file, '-c', 'copy', '-c:s', 'mov_text', '-metadata:s:s:0', f'language={caption_code}', '-metadata:s:s:0', f'title={caption_lang}', '-metadata:s:s:0', f'handler_name={caption_lang}']}
+            outputs={output_temp_file_with_subs: output_args}
         )
-        ff.run(stdout=devnull, stderr=devnull)
+        with span('ffmpeg', output=os.path.basename(output_file)):
+            ff.run(stdout=devnull, stderr=devnull)
         devnull.close()
 
-        shutil.move(output_temp_file_with_subs, output_file)
-        postprocess_cleanup(tempDIR, ['_vdo.' + file_extention, '_cap.srt', '_merged.' + file_extention], random_filename)
+        output_file = finalize_output_file(output_temp_file_with_subs, output_file)
+        postprocess_cleanup(tempDIR, ['_vdo.' + file_extention, '_merged.' + file_extention] + get_caption_suffixes(caption_code), random_filename)
         print('Done! 🎉')
     else:
         print('Processing...')
-        shutil.move(output_temp_file, output_file)
+        output_file = finalize_output_file(output_temp_file, output_file)
         print('Done! 🎉')
+    return output_file
+
+def run_workers(fn, calls, workers):
+    """Run fn(*args) for every args of calls on a thread pool and return the results in order.
+    When the caller is interrupted (Ctrl+C) or a call fails, calls that haven't started are dropped and running
+    ones stop at their next chunk (see transferred), instead of the pool running every queued transfer to the end"""
+    from concurrent.futures import ThreadPoolExecutor
+    stop_event = threading.Event()
+    token = stop_events.set(stop_events.get() + (stop_event,))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = []
+    try:
+        futures = [executor.submit(in_context(fn), *args) for args in calls]
+        return [future.result() for future in futures]
+    except BaseException:
+        stop_event.set()
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        stop_events.reset(token)
+        executor.shutdown(wait=False)
 
-def download_nonprogressive(stream, itag_vdo, itag_ado, file_extention, output_path):
-    global total_filesize, progress_bar
+def download_nonprogressive(stream, itag_vdo, itag_ado, file_extention, output_path, connections=1, video_id=None):
     selected_vdo = stream.get_by_itag(itag_vdo)
     selected_ado = stream.get_by_itag(itag_ado)
-    random_filename = str(random.randint(1000000000, 9999999999))
-    total_filesize = selected_vdo.filesize
-    progress_bar = tqdm(total=total_filesize, unit='B', unit_scale=True, desc="Downloading Video")
-    selected_vdo.download(output_path=output_path, filename=random_filename + '_vdo.' + file_extention)
-    total_filesize = selected_ado.filesize
-    progress_bar = tqdm(total=total_filesize, unit='B', unit_scale=True, desc="Downloading Audio")
-    selected_ado.download(output_path=output_path, filename=random_filename + '_ado.' + file_extention)
+    random_filename = get_temp_filename(video_id, itag_vdo)
+    # Video and audio tracks are fetched in parallel, each with its own progress bar
+    run_workers(download_with_progress, [
+        (selected_vdo, output_path, random_filename + '_vdo.' + file_extention, "Downloading Video", 0, connections),
+        (selected_ado, output_path, random_filename + '_ado.' + file_extention, "Downloading Audio", 1, connections)
+    ], 2)
     return random_filename
 
-def download_audio(stream, itag, output_path):
-    global total_filesize, progress_bar
+def download_audio(stream, itag, output_path, connections=1, video_id=None):
     selected_ado = stream.get_by_itag(itag)
-    total_filesize = selected_ado.filesize
-    progress_bar = tqdm(total=total_filesize, unit='B', unit_scale=True, desc="Downloading Audio")
-    random_filename = str(random.randint(1000000000, 9999999999))
-    selected_ado.download(output_path=output_path, filename=random_filename + '_ado.mp4')
+    random_filename = get_temp_filename(video_id, itag)
+    download_with_progress(selected_ado, output_path, random_filename + '_ado.mp4', "Downloading Audio", connections=connections)
     return random_filename
 
-def download_thumbnail(url, file_path):
+def get_temp_filename(video_id, itag):
+    # Temp files of a video are named deterministically so an interrupted download can be resumed
+    if video_id:
+        return f'{video_id}_{itag}'
+    return str(random.randint(1000000000, 9999999999))
+
+def download_with_progress(selected_stream, output_path, filename, desc, position=0, connections=1):
+    file_path = os.path.join(output_path, filename)
+    with span('transfer', file=filename, itag=selected_stream.itag, size=selected_stream.filesize, connections=connections):
+        # SABR streams can't be fetched by byte ranges, so they always go through pytubefix
+        if not getattr(selected_stream, 'is_sabr', False) and selected_stream.filesize:
+            download_segmented(selected_stream.url, selected_stream.filesize, file_path, desc, position, connections)
+            return
+        # The progress bar travels with the stream so the progress callback needs no shared state
+        selected_stream.progress_bar = create_progress_bar(selected_stream.filesize, desc, position)
+        selected_stream.download(output_path=output_path, filename=filename)
+
+def load_journal(journal_file, filesize):
+    try:
+        with open(journal_file, 'r') as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if journal.get('filesize') != filesize:
+        return []
+    return [tuple(segment) for segment in journal.get('completed', [])]
+
+def save_journal(journal_file, filesize, completed):
+    with open(journal_file + '.tmp', 'w') as f:
+        json.dump({'filesize': filesize, 'completed': completed}, f)
+    os.replace(journal_file + '.tmp', journal_file)
+
+def get_missing_segments(completed, filesize, segment_size):
+    segments = []
+    position = 0
+    for start, end in sorted(completed) + [(filesize, filesize)]:
+        while position < start:
+            segment_end = min(position + segment_size, start) - 1
+            segments.append((position, segment_end))
+            position = segment_end + 1
+        position = max(position, end + 1)
+    return segments
+
+def download_segmented(url, filesize, file_path, desc, position=0, connections=1, segment_size=None, max_retries=3):
+    import requests
+    if os.path.isfile(file_path) and os.path.getsize(file_path) == filesize:
+        print(f'{desc}: already downloaded, skipping...')
+        return
+
+    segment_size = segment_size or load_config()['segmentSize']
+    part_file = file_path + '.part'
+    journal_file = part_file + '.json'
+
+    # Byte ranges completed by an earlier (interrupted) run are kept in a journal next to the .part file
+    completed = load_journal(journal_file, filesize) if os.path.isfile(part_file) else []
+    if not completed:
+        # Preallocate the whole file so every segment can be written in place
+        with open(part_file, 'wb') as file:
+            file.truncate(filesize)
+        save_journal(journal_file, filesize, completed)
+    # Ranges stay within segmentSize even with a single connection (fetched one after the other), as googlevideo throttles larger ones
+    segments = get_missing_segments(completed, filesize, segment_size)
+
+    progress_bar = create_progress_bar(filesize, desc, position, sum(end - start + 1 for start, end in completed))
+    progress_lock = threading.Lock()
+    journal_lock = threading.Lock()
+
+    def update_progress(size):
+        with progress_lock:
+            progress_bar.update(size)
+
+    def fetch_segment(segment):
+        start, end = segment
+        for attempt in range(max_retries + 1):
+            # Segments still queued when the download is stopped are never requested
+            check_cancelled()
+            received = 0
+            try:
+                # Same range query parameter pytubefix uses for its chunked requests
+                with http_get(f"{url}{'&' if '?' in url else '?'}range={start}-{end}", stream=True) as response, open(part_file, 'r+b') as file:
+                    response.raise_for_status()
+                    file.seek(start)
+                    for chunk in response.iter_content(chunk_size=65536):
+                        file.write(chunk)
+                        received += len(chunk)
+                        update_progress(len(chunk))
+                        transferred(len(chunk))
+                if received == end - start + 1:
+                    with journal_lock:
+                        completed.append(segment)
+                        save_journal(journal_file, filesize, completed)
+                    return
+                error = IOError(f'Incomplete segment {start}-{end} ({received} of {end - start + 1} bytes)')
+            except requests.RequestException as e:
+                error = e
+            update_progress(-received)
+        raise error
+
+    try:
+        run_workers(fetch_segment, [(segment,) for segment in segments], connections)
+    finally:
+        progress_bar.close()
+
+    os.replace(part_file, file_path)
+    os.remove(journal_file)
+
+def streaming_supported(*selected_streams):
+    # Streams are fed to ffmpeg through named pipes, which are only available on POSIX systems
+    return hasattr(os, 'mkfifo') and all(not getattr(selected_stream, 'is_sabr', False) and selected_stream.filesize for selected_stream in selected_streams)
+
+def fetch_range(url, start, end, max_retries=3):
+    import requests
+    for attempt in range(max_retries + 1):
+        try:
+            data = bytearray()
+            with http_get(f"{url}{'&' if '?' in url else '?'}range={start}-{end}", stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=65536):
+                    data += chunk
+                    transferred(len(chunk))
+            if len(data) == end - start + 1:
+                return bytes(data)
+            error = IOError(f'Incomplete segment {start}-{end} ({len(data)} of {end - start + 1} bytes)')
+        except requests.RequestException as e:
+            error = e
+    raise error
+
+def open_pipe_writer(pipe_path, stop_event):
+    # Opening a FIFO blocks until ffmpeg opens it for reading, so poll instead to be able to give up when ffmpeg fails first
+    while True:
+        try:
+            fd = os.open(pipe_path, os.O_WRONLY | os.O_NONBLOCK)
+            os.set_blocking(fd, True)
+            return os.fdopen(fd, 'wb')
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+        if stop_event.wait(0.05):
+            return None
+
+def stream_to_pipe(selected_stream, pipe_path, desc, stop_event, position=0, connections=1, segment_size=None):
+    from concurrent.futures import ThreadPoolExecutor
+    from collections import deque
+    from itertools import islice
+    segment_size = segment_size or load_config()['segmentSize']
+    url, filesize = selected_stream.url, selected_stream.filesize
+    pipe = open_pipe_writer(pipe_path, stop_event)
+    if pipe is None:
+        return
+
+    progress_bar = create_progress_bar(filesize, desc, position)
+    segments = iter(get_missing_segments([], filesize, segment_size))
+    try:
+        with pipe, ThreadPoolExecutor(max_workers=connections) as executor:
+            # Up to `connections` segments are fetched ahead, but they are written to the pipe strictly in order
+            pending = deque(executor.submit(in_context(fetch_range), url, *segment) for segment in islice(segments, connections))
+            while pending:
+                data = pending.popleft().result()
+                next_segment = next(segments, None)
+                if next_segment:
+                    pending.append(executor.submit(in_context(fetch_range), url, *next_segment))
+                if stop_event.is_set():
+                    return
+                pipe.write(data)
+                progress_bar.update(len(data))
+    finally:
+        progress_bar.close()
+
+# Thumbnail variants, best first
+THUMBNAIL_VARIANTS = ['maxresdefault', 'hqdefault']
+
+def get_thumbnail_urls(url):
+    return [re.sub(r'/[^/]*\.jpg.*$', f'/{variant}.jpg', url) for variant in THUMBNAIL_VARIANTS]
+
+def use_cached_thumbnail(video_id, file_path):
+    for variant in THUMBNAIL_VARIANTS:
+        cached_file = read_cache_file('thumbnail', f'{video_id}_{variant}.jpg') if video_id else None
+        if cached_file:
+            shutil.copyfile(cached_file, file_path)
+            return True
+    return False
+
+def save_thumbnail(video_id, images, file_path):
+    # images holds the downloaded content of every variant (None if unavailable), in THUMBNAIL_VARIANTS order
+    for variant, image in zip(THUMBNAIL_VARIANTS, images):
+        if image:
+            with open(file_path, 'wb') as file:
+                file.write(image)
+            if video_id:
+                write_cache_file('thumbnail', f'{video_id}_{variant}.jpg', image, max_bytes=load_config()['thumbnailCacheSize'])
+            return True
+    return False
+
+def download_thumbnail(url, file_path, video_id=None):
+    """Save the best available thumbnail of a video to file_path, from the thumbnail cache when possible (returns False if no variant is available)"""
+    from concurrent.futures import ThreadPoolExecutor
+    import requests
+    if use_cached_thumbnail(video_id, file_path):
+        return True
     print('Downloading thumbnail...')
-    maxres_url = re.sub(r'/[^/]*\.jpg.*$', '/maxresdefault.jpg', url)
-    hq_url = re.sub(r'/[^/]*\.jpg.*$', '/hqdefault.jpg', url)
-    
-    response = requests.get(maxres_url, stream=True)
-    if response.status_code != 200:
-        response = requests.get(hq_url, stream=True)
-    
-    if response.status_code == 200:
-        with open(file_path, 'wb') as file:
-            response.raw.decode_content = True
-            shutil.copyfileobj(response.raw, file)
-    else:
-        print('Failed to download thumbnail...!')
-        sys.exit()
+    thumbnail_span = span('thumbnail', video_id=video_id)
+
+    def fetch_variant(thumbnail_url):
+        try:
+            with http_get(thumbnail_url) as response:
+                if response.status_code != 200 or not response.content:
+                    return None
+                transferred(len(response.content))
+                return response.content
+        except requests.RequestException:
+            return None
+
+    # Every variant is probed at once, so falling back to a lower one costs no extra round trip
+    with thumbnail_span, ThreadPoolExecutor(max_workers=len(THUMBNAIL_VARIANTS)) as executor:
+        images = list(executor.map(in_context(fetch_variant), get_thumbnail_urls(url)))
+    if save_thumbnail(video_id, images, file_path):
+        return True
+    print('Failed to download thumbnail...!')
+    return False
 
-def progress(chunk, file_handle, bytes_remaining):
-    chunk_size = total_filesize - bytes_remaining
-    progress_bar.update(chunk_size - progress_bar.n)
+def progress(selected_stream, chunk, bytes_remaining):
+    # Streams downloaded by pytubefix are throttled from its progress callback, which runs after every chunk
+    transferred(len(chunk))
+    progress_bar = selected_stream.progress_bar
+    downloaded_size = selected_stream.filesize - bytes_remaining
+    progress_bar.update(downloaded_size - progress_bar.n)
 
     if bytes_remaining == 0:
         progress_bar.close()
\ No newline at end of file
@@ -1,21 +1,34 @@
-from pytubefix import YouTube
-from tabulate import tabulate
-from rich import print as rprint
 from .config import get_temporary_directory, load_config, update_config, reset_config
-from .download import download_progressive, download_nonprogressive, download_audio, progress
-from .postprocess import merge_audio_video, convert_to_mp3
-from .utils import get_version, clear_temp_files, is_valid_url, network_available, ffmpeg_installed, nodejs_installed, unpack_caption, check_update
+from .cache import read_cache, write_cache
+from .download import download_progressive, download_nonprogressive, download_audio, streaming_supported, progress
+from .postprocess import merge_audio_video, stream_merge_audio_video, convert_to_mp3
+from .streams import build_stream_index
+from .subtitles import split_captions, join_captions
+from .archive import record_download, find_download
+from .ratelimit import parse_rate, set_rate_limit
+from .metrics import span, enable_metrics, print_profile
+from .serve import serve, submit_to_daemon
+from .utils import rprint, get_version, clear_temp_files, list_partial_downloads, expire_partial_downloads, load_jobs, save_job, remove_job, is_valid_url, is_collection_url, get_video_id, network_available, ffmpeg_installed, nodejs_installed, async_engine_available, unpack_caption, format_filesize, check_update
 from .postinstaller import postinstall
-import appdirs, os, re, sys, argparse, json
+import appdirs, os, re, sys, argparse, json, atexit
 
 class YouTubeDownloader:
-    def __init__(self):
-        self.user_config = load_config()
+    def __init__(self, user_config=None):
+        self.user_config = user_config or load_config()
         self.download_dir = self.user_config['downloadDIR']
-        self.temp_dir = get_temporary_directory()
         self.config_dir = appdirs.user_config_dir('pytubepp')
         self.default_stream = self.user_config['defaultStream']
-        self.default_caption = self.user_config['defaultCaption']
+        self.default_caption = join_captions(self.user_config['defaultCaption']) or 'none'
+        self.info_cache_ttl = self.user_config['infoCacheTTL']
+        self.info_cache_size = self.user_config['infoCacheSize']
+        self.offline = False
+        self.connections = self.user_config['connections']
+        self.streaming_mux = self.user_config['streamingMux']
+        self.async_engine = self.user_config['asyncEngine']
+        self.network_check = self.user_config['networkCheck']
+        self.resolve_workers = self.user_config['resolveWorkers']
+        self.skip_existing = self.user_config['skipExisting']
+        self.archive_verify = self.user_config['archiveVerify']
         self.version = get_version()
         
         # Video attributes
@@ -25,7 +38,12 @@ class YouTubeDownloader:
         self.thumbnail = None
         self.views = None
         self.stream = None
+        self.stream_index = None
         self.maxres = None
+
+        # Per-invocation cache of resolved videos (keyed by video id)
+        self.resolved_videos = {}
+        self.environment_checked = False
         
         self.stream_resolutions = {
             '4320p': {'allowed_streams': ['8k', '4320', '4320p'], 'message': ['4320p', '[8k, 4320, 4320p]']},
@@ -40,159 +58,215 @@ class YouTubeDownloader:
             'mp3': {'allowed_streams': ['mp3'], 'message': ['mp3', '[mp3]']}
         }
 
-    def set_video_info(self, link):
-        if not network_available():
+    @property
+    def temp_dir(self):
+        # Created on first use, so commands that download nothing (-v, -i, -sc...) leave no staging folder behind
+        return get_temporary_directory()
+
+    def check_environment(self):
+        with span('network_check'):
+            network_ok = not self.network_check or network_available()
+        if not network_ok:
             print('\nRequest timeout! Please check your network and try again...!!')
             sys.exit()
 
-        if not nodejs_installed():
+        with span('nodejs_check'):
+            nodejs_ok = nodejs_installed()
+        if not nodejs_ok:
             rprint("\n[dark_orange]WARNING:[/dark_orange] Node.js is not installed or not found in PATH!")
             print("BotGuard poToken generation will not work properly without Node.js environment")
             rprint("Please install Node.js, by running: [green]pytubepp --postinstall[/green] or read [steel_blue3]https://github.com/neosubhamoy/pytubepp#%EF%B8%8F-installation[/steel_blue3] for manual instructions\n")
         
-        update = check_update()
+        with span('update_check'):
+            update = check_update()
         if update[0]:
             rprint(f'\n[blue]NOTE:[/blue] A newer version of pytubepp is available! ([dark_orange]v{update[1]}[/dark_orange] -> [light_green]v{update[2]}[/light_green])')
             rprint(f'Please upgrade to the latest version using: [green]{update[3]}[/green]')
-        
+        self.environment_checked = True
+
+    def resolve_video(self, link):
+        """Resolve a video once per invocation and reuse it for every later lookup of the same video id"""
+        video_id = get_video_id(link)
+        if video_id not in self.resolved_videos:
+            if not self.environment_checked:
+                self.check_environment()
+
+            from pytubefix import YouTube
+            with span('resolve', video_id=video_id):
+                video = YouTube(is_valid_url(link).group(1), on_progress_callback=progress)
+                stream = video.streams
+                # Every info and download path picks its streams from this index
+                stream_index = build_stream_index(stream)
+                maxres = next((res for res in stream_index if res != 'mp3'), None)
+
+                self.resolved_videos[video_id] = {
+                    'video': video,
+                    'author': video.author,
+                    'title': re.sub(r'[\\/*?:"<>|]', '_', video.author + ' - ' + video.title),
+                    'thumbnail': video.thumbnail_url,
+                    'views': str(video.views),
+                    'stream': stream,
+                    'captions': video.captions,
+                    'stream_index': stream_index,
+                    'maxres': maxres
+                }
+        return self.resolved_videos[video_id]
+
+    def set_video_info(self, link):
         if is_valid_url(link):
-            link = is_valid_url(link).group(1)
-            self.video = YouTube(link, on_progress_callback=progress)
-            self.author = self.video.author
-            self.title = re.sub(r'[\\/*?:"<>|]', '_', self.author + ' - ' + self.video.title)
-            self.thumbnail = self.video.thumbnail_url
-            self.views = str(self.video.views)
-            self.stream = self.video.streams
-            self.captions = self.video.captions
-            
-            # Find maximum resolution
-            for res in self.stream_resolutions.keys():
-                if res != 'mp3' and self.stream.filter(res=res):
-                    self.maxres = res
-                    break
+            resolved = self.resolve_video(link)
+            self.video = resolved['video']
+            self.author = resolved['author']
+            self.title = resolved['title']
+            self.thumbnail = resolved['thumbnail']
+            self.views = resolved['views']
+            self.stream = resolved['stream']
+            self.captions = resolved['captions']
+            self.stream_index = resolved['stream_index']
+            self.maxres = resolved['maxres']
             return True
         return False
 
-    def get_stream_info(self, res, matching_stream):
-        """Helper method to get stream information based on resolution"""
-        stream_info = {}
-        
-        if res == 'mp3':
-            stream_info = {
+    def get_stream_info(self, candidate):
+        """Helper method to get stream information of a download candidate from the stream index"""
+        video_stream, audio_stream = candidate['video'], candidate['audio']
+        if candidate['res'] == 'mp3':
+            return {
                 'type': "audio/mp3",
-                'filesize': f"{matching_stream.filesize / (1024 * 1024 * 1024):.2f} GB" if matching_stream.filesize >= 1073741824 else f"{matching_stream.filesize / (1024 * 1024):.2f} MB",
-                'raw_filesize': matching_stream.filesize,
+                'filesize': format_filesize(audio_stream.filesize),
+                'raw_filesize': audio_stream.filesize,
                 'fps': None,
                 'raw_fps': None,
                 'vdo_codec': None,
-                'ado_codec': matching_stream.audio_codec,
-                'vdo_bitrate': None,
-                'ado_bitrate': matching_stream.abr
-            }
-        elif res == '360p':
-            stream_info = {
-                'type': matching_stream.mime_type,
-                'filesize': f"{matching_stream.filesize / (1024 * 1024 * 1024):.2f} GB" if matching_stream.filesize >= 1073741824 else f"{matching_stream.filesize / (1024 * 1024):.2f} MB",
-                'raw_filesize': matching_stream.filesize,
-                'fps': f"{matching_stream.fps}fps",
-                'raw_fps': matching_stream.fps,
-                'vdo_codec': matching_stream.video_codec,
-                'ado_codec': matching_stream.audio_codec,
-                'vdo_bitrate': f"{matching_stream.bitrate / 1024:.0f}kbps",
-                'ado_bitrate': matching_stream.abr
-            }
-        else:
-            _select_suitable_audio_stream = lambda stream: 251 if stream.mime_type == 'video/webm' else 140
-            # Check for HDR variants first
-            hdr_stream = None
-            if res in ['4320p', '2160p', '1440p', '1080p', '720p']:
-                hdr_itags = {'4320p': 702, '2160p': 701, '1440p': 700, '1080p': 699, '720p': 698}
-                hdr_stream = self.stream.get_by_itag(hdr_itags.get(res))
-            
-            # Use HDR stream if available, otherwise use the original stream
-            final_stream = hdr_stream if hdr_stream else matching_stream
-            
-            # For 720p, check if HigherFps MP4 version exists and prefer it
-            if res == '720p' and not hdr_stream:
-                higher_fps_stream = self.stream.get_by_itag(298)
-                if higher_fps_stream:
-                    final_stream = higher_fps_stream
-            
-            audio_stream = self.stream.get_by_itag(_select_suitable_audio_stream(final_stream))
-            
-            total_size = final_stream.filesize + audio_stream.filesize
-            
-            stream_info = {
-                'type': final_stream.mime_type,
-                'filesize': f"{total_size / (1024 * 1024 * 1024):.2f} GB" if total_size >= 1073741824 else f"{total_size / (1024 * 1024):.2f} MB",
-                'raw_filesize': total_size,
-                'fps': f"{final_stream.fps}fps",
-                'raw_fps': final_stream.fps,
-                'vdo_codec': final_stream.video_codec,
                 'ado_codec': audio_stream.audio_codec,
-                'vdo_bitrate': f"{final_stream.bitrate / 1024:.0f}kbps",
-                'ado_bitrate': audio_stream.abr,
-                'is_hdr': bool(hdr_stream),  # Track if this is an HDR stream
-                'stream_itag': final_stream.itag  # Track the actual itag being used
+                'vdo_bitrate': None,
+                'ado_bitrate': audio_stream.abr
             }
-            
-        return stream_info
 
-    def show_video_info(self, link):
-        if self.set_video_info(link):
-            table = []
-            found = False
-
-            for res in self.stream_resolutions.keys():
-                if found or (res not in ['mp3'] and self.stream.filter(res=res)) or (res == 'mp3' and self.stream.get_by_itag(140)):
-                    found = True
-                    matching_stream = self.stream.get_by_itag(140) if res == 'mp3' else next((s for s in self.stream if s.resolution == res), None)
-                    
-                    if matching_stream:
-                        stream_info = self.get_stream_info(res, matching_stream)
-                        message = self.stream_resolutions[res]['message'] + [
-                            stream_info['type'],
-                            stream_info['filesize'],
-                            stream_info['fps'] if stream_info['fps'] else "none",
-                            stream_info['vdo_codec'] if stream_info['vdo_codec'] else "none",
-                            stream_info['ado_codec'],
-                            stream_info['vdo_bitrate'] if stream_info['vdo_bitrate'] else "none",
-                            stream_info['ado_bitrate']
-                        ]
-                        table.append(message)
-
-            if not found:
-                print('Sorry, No video streams found....!!!')
+        total_size = video_stream.filesize if candidate['progressive'] else video_stream.filesize + audio_stream.filesize
+        return {
+            'type': video_stream.mime_type,
+            'filesize': format_filesize(total_size),
+            'raw_filesize': total_size,
+            'fps': f"{video_stream.fps}fps",
+            'raw_fps': video_stream.fps,
+            'vdo_codec': video_stream.video_codec,
+            'ado_codec': audio_stream.audio_codec,
+            'vdo_bitrate': f"{video_stream.bitrate / 1024:.0f}kbps",
+            'ado_bitrate': audio_stream.abr,
+            'is_hdr': candidate['hdr'],  # Track if this is an HDR stream
+            'stream_itag': video_stream.itag  # Track the actual itag being used
+        }
+
+    def build_video_details(self):
+        """Helper method to build the cacheable info payload of the current video"""
+        streams_list = []
+        for res, candidates in self.stream_index.items():
+            stream_info = self.get_stream_info(candidates[0])
+            streams_list.append({
+                'itag': stream_info.get('stream_itag', candidates[0]['audio'].itag),
+                'res': res,
+                'mime_type': stream_info['type'],
+                'file_size': stream_info['raw_filesize'],
+                'fps': stream_info['raw_fps'],
+                'vcodec': stream_info['vdo_codec'],
+                'acodec': stream_info['ado_codec'],
+                'vbitrate': stream_info['vdo_bitrate'],
+                'abitrate': stream_info['ado_bitrate'],
+                'is_hdr': stream_info.get('is_hdr', False)
+            })
+
+        if not streams_list:
+            print('Sorry, No video streams found....!!!')
+            sys.exit()
+
+        captions_list = []
+        if self.captions:
+            for caption in self.captions:
+                cap_code, cap_lang = unpack_caption(caption)
+                captions_list.append({
+                    'code': cap_code,
+                    'lang': cap_lang
+                })
+
+        return {
+            'info': {
+                'id': self.video.video_id,
+                'title': self.video.title,
+                'author': self.author,
+                'thumbnail_url': self.thumbnail,
+                'views': self.video.views,
+                'published_on': self.video.publish_date.strftime('%d/%m/%Y') if self.video.publish_date else None,
+                'duration': self.video.length,
+                'streams': streams_list,
+                'captions': captions_list or None
+            },
+            'raw_streams': [str(stream) for stream in self.stream],
+            'raw_captions': [str(caption) for caption in self.captions]
+        }
+
+    def get_video_details(self, link):
+        """Return the info payload of a video from the on-disk cache, resolving and caching it on a miss"""
+        video_id = get_video_id(link)
+        if not video_id:
+            return None
+
+        details = read_cache('info', video_id, None if self.offline else self.info_cache_ttl)
+        if details is None:
+            if self.offline:
+                print('\nVideo info not found in cache! Please run once without --offline flag...!!')
                 sys.exit()
+            self.set_video_info(link)
+            details = self.build_video_details()
+            write_cache('info', video_id, details, max_entries=self.info_cache_size)
+        return details
 
-            print(f'\nTitle: {self.video.title}\nAuthor: {self.author}\nPublished On: {self.video.publish_date.strftime("%d/%m/%Y") if self.video.publish_date else "Unknown"}\nDuration: {f"{self.video.length//3600:02}:{(self.video.length%3600)//60:02}:{self.video.length%60:02}" if self.video.length >= 3600 else f"{(self.video.length%3600)//60:02}:{self.video.length%60:02}"}\nViews: {self.views}\nCaptions: {"Available" if self.captions else "Unavailable"}')
+    def show_video_info(self, link):
+        from tabulate import tabulate
+        details = self.get_video_details(link)
+        if details:
+            info = details['info']
+            table = []
+            for stream in info['streams']:
+                table.append(self.stream_resolutions[stream['res']]['message'] + [
+                    stream['mime_type'],
+                    format_filesize(stream['file_size']),
+                    f"{stream['fps']}fps" if stream['fps'] else "none",
+                    stream['vcodec'] if stream['vcodec'] else "none",
+                    stream['acodec'],
+                    stream['vbitrate'] if stream['vbitrate'] else "none",
+                    stream['abitrate']
+                ])
+
+            duration = info['duration']
+            print(f'\nTitle: {info["title"]}\nAuthor: {info["author"]}\nPublished On: {info["published_on"] or "Unknown"}\nDuration: {f"{duration//3600:02}:{(duration%3600)//60:02}:{duration%60:02}" if duration >= 3600 else f"{(duration%3600)//60:02}:{duration%60:02}"}\nViews: {info["views"]}\nCaptions: {"Available" if info["captions"] else "Unavailable"}')
                 
             print('\n')
             print(tabulate(table, headers=['Stream', 'Alias (for -s flag)', 'Format', 'Size', 'FrameRate', 'V-Codec', 'A-Codec', 'V-BitRate', 'A-BitRate']))
             print('\n')
 
-            if self.captions:
+            if info['captions']:
                 caption_table = []
-                for caption in self.captions:
-                    cap_code, cap_lang = unpack_caption(caption)
-                    caption_table.append([cap_lang, cap_code])
+                for caption in info['captions']:
+                    caption_table.append([caption['lang'], caption['code']])
                 print(tabulate(caption_table, headers=['Caption', 'CaptionCode (for -c flag)']))
                 print('\n')
         else:
             print('\nInvalid video link! Please enter a valid video url...!!')
 
     def show_all_streams(self, link):
-        if self.set_video_info(link):
-            print(f"Available Streams({len(self.stream)}):")
-            if self.stream:
-                for stream in self.stream:
+        details = self.get_video_details(link)
+        if details:
+            print(f"Available Streams({len(details['raw_streams'])}):")
+            if details['raw_streams']:
+                for stream in details['raw_streams']:
                     print(stream)
             else:
                 print('No stream available!')
 
-            print(f"\nAvailable Captions({len(self.captions)}):")
-            if self.captions:
-                for caption in self.captions:
+            print(f"\nAvailable Captions({len(details['raw_captions'])}):")
+            if details['raw_captions']:
+                for caption in details['raw_captions']:
                     print(caption)
             else:
                 print('No caption available!')
@@ -200,67 +274,17 @@ class YouTubeDownloader:
             print('\nInvalid video link! Please enter a valid video url...!!')
 
     def show_raw_info(self, link, prettify=False):
-        if self.set_video_info(link):
-            streams_list = []
-            found = False
-
-            for res in self.stream_resolutions.keys():
-                if found or (res not in ['mp3'] and self.stream.filter(res=res)) or (res == 'mp3' and self.stream.get_by_itag(140)):
-                    found = True
-                    matching_stream = self.stream.get_by_itag(140) if res == 'mp3' else next((s for s in self.stream if s.resolution == res), None)
-                    
-                    if matching_stream:
-                        stream_info = self.get_stream_info(res, matching_stream)
-                        streams_list.append({
-                            'itag': stream_info.get('stream_itag', matching_stream.itag),
-                            'res': res,
-                            'mime_type': stream_info['type'],
-                            'file_size': stream_info['raw_filesize'],
-                            'fps': stream_info['raw_fps'],
-                            'vcodec': stream_info['vdo_codec'],
-                            'acodec': stream_info['ado_codec'],
-                            'vbitrate': stream_info['vdo_bitrate'],
-                            'abitrate': stream_info['ado_bitrate'],
-                            'is_hdr': stream_info.get('is_hdr', False)
-                        })
-
-            if not found:
-                print('Sorry, No video streams found....!!!')
-                sys.exit()
-
-            captions_list = []
-            if self.captions:
-                for caption in self.captions:
-                    cap_code, cap_lang = unpack_caption(caption)
-                    captions_list.append({
-                        'code': cap_code,
-                        'lang': cap_lang
-                    })
-
-            output = {
-                'id': self.video.video_id,
-                'title': self.video.title,
-                'author': self.author,
-                'thumbnail_url': self.thumbnail,
-                'views': self.video.views,
-                'published_on': self.video.publish_date.strftime('%d/%m/%Y') if self.video.publish_date else None,
-                'duration': self.video.length,
-                'streams': streams_list,
-                'captions': captions_list or None
-            }
-            
-            print(json.dumps(output, indent=4 if prettify else None))
+        details = self.get_video_details(link)
+        if details:
+            print(json.dumps(details['info'], indent=4 if prettify else None))
         else:
             print('\nInvalid video link! Please enter a valid video url...!!')
 
     def get_allowed_streams(self, link):
         if self.set_video_info(link):
             allowed_streams = []
-            found = False
-            for res in self.stream_resolutions.keys():
-                if found or (res not in ['mp3'] and self.stream.filter(res=res)) or (res == 'mp3' and self.stream.get_by_itag(140)):
-                    found = True
-                    allowed_streams.extend(self.stream_resolutions[res]['allowed_streams'])
+            for res in self.stream_index:
+                allowed_streams.extend(self.stream_resolutions[res]['allowed_streams'])
             return allowed_streams
         else:
             print('\nInvalid video link! Please enter a valid video url...!!')
@@ -273,42 +297,44 @@ class YouTubeDownloader:
             print('\nInvalid video link! Please enter a valid video url...!!')
             return []
 
+    def captions_available(self, caption_code):
+        # Every caption of a selection like en,es,a.fr has to be available
+        caption_codes = split_captions(caption_code)
+        return bool(caption_codes) and all(code in self.captions.keys() for code in caption_codes)
+
+    def get_stream_candidate(self, chosen_stream, stream_index=None):
+        """Return the best download candidate of a stream alias (eg: 4k, 1080, 720p) from the stream index"""
+        res = next((k for k, v in self.stream_resolutions.items() if chosen_stream in v['allowed_streams']), None)
+        candidates = (stream_index or self.stream_index).get(res)
+        return candidates[0] if candidates else None
+
+    def find_archived_download(self, link, chosen_stream=None, chosen_caption=None):
+        """Archived download of a video with the chosen (or default) stream, and the chosen caption when one was given"""
+        stream = chosen_stream or self.default_stream
+        res = 'max' if stream == 'max' else next((k for k, v in self.stream_resolutions.items() if stream in v['allowed_streams']), None)
+        if not res:
+            # Unknown streams are reported by the download itself
+            return None
+        caption = join_captions(chosen_caption) if chosen_caption and res != 'mp3' else None
+        return find_download(get_video_id(link), res, caption, self.archive_verify)
+
+    def stream_available(self, res):
+        return res in self.stream_index
+
     def print_short_info(self, chosen_stream, chosen_caption=None):
         print(f'\nTitle: {self.title}')
-        
-        if chosen_stream == 'mp3':
-            print(f'Selected: Audio [128kbps (140)] --> (MP3)')
+        candidate = self.get_stream_candidate(chosen_stream)
+        if not candidate:
             return
-            
-        if chosen_stream in ['360', '360p']:
-            print(f"Selected: Video [360p (18)] + Audio [96kbps (18)]{f' + Caption [{chosen_caption}]' if chosen_caption else ''} --> (MP4)")
-            return
-            
-        _select_suitable_audio_stream = lambda stream: 251 if stream.mime_type == 'video/webm' else 140
-        res = next((k for k, v in self.stream_resolutions.items() if chosen_stream in v['allowed_streams']), None)
-        
-        if res:
-            hdr_stream = None
-            if res in ['4320p', '2160p', '1440p', '1080p', '720p']:
-                hdr_itags = {'4320p': 702, '2160p': 701, '1440p': 700, '1080p': 699, '720p': 698}
-                hdr_stream = self.stream.get_by_itag(hdr_itags.get(res))
-            
-            matching_stream = hdr_stream if hdr_stream else self.stream.filter(res=res).first()
-            
-            if res == '720p' and not hdr_stream:
-                high_fps_stream = self.stream.get_by_itag(298)
-                if high_fps_stream:
-                    matching_stream = high_fps_stream
-            
-            audio_stream = self.stream.get_by_itag(_select_suitable_audio_stream(matching_stream))
-            
-            output_format = 'MP4'
-            if matching_stream.mime_type == 'video/webm':
-                output_format = 'WEBM'
-            
-            print(f"Selected: Video [{res} ({matching_stream.itag})] + Audio [{audio_stream.abr} ({audio_stream.itag})]{f' + Caption [{chosen_caption}]' if chosen_caption else ''} --> ({output_format})")
+        video_stream, audio_stream = candidate['video'], candidate['audio']
+
+        if candidate['res'] == 'mp3':
+            print(f'Selected: Audio [{audio_stream.abr} ({audio_stream.itag})] --> (MP3)')
+        else:
+            print(f"Selected: Video [{candidate['res']} ({video_stream.itag})] + Audio [{audio_stream.abr} ({audio_stream.itag})]{f' + Caption [{chosen_caption}]' if chosen_caption else ''} --> ({candidate['ext'].upper()})")
 
     def download_stream(self, link, chosen_stream, chosen_caption=None):
+        """Download the chosen stream of a video and return the output file path (None if nothing was downloaded)"""
         if not ffmpeg_installed():
             rprint("\n[dark_orange]WARNING:[/dark_orange] FFmpeg is not installed or not found in PATH!")
             print("Some core functionalities like video processing will not work properly without FFmpeg")
@@ -319,92 +345,204 @@ class YouTubeDownloader:
             allowed_streams = self.get_allowed_streams(link)
             allowed_captions = self.get_allowed_captions(link)
 
-            if chosen_caption and (chosen_caption not in allowed_captions):
+            if chosen_caption and not all(code in allowed_captions for code in split_captions(chosen_caption)):
                 print('\nInvalid caption code or caption not available! Please choose a different caption...!! (use -i to see available captions)')
                 sys.exit()
             
             if chosen_stream in allowed_streams:
                 self.print_short_info(chosen_stream, chosen_caption)
-                if chosen_stream in ['360', '360p']:
-                    download_progressive(self.stream, 18, self.title, '360p', 'mp4', self.captions, chosen_caption)
-                elif chosen_stream in ['1080', '1080p', 'fhd']:
-                    self._handle_1080p_download(chosen_caption)
-                elif chosen_stream in ['720', '720p', 'hd']:
-                    self._handle_720p_download(chosen_caption)
-                elif chosen_stream in ['480', '480p']:
-                    merge_audio_video(self.title, '480p', 'mp4', download_nonprogressive(self.stream, 135, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-                elif chosen_stream in ['240', '240p']:
-                    merge_audio_video(self.title, '240p', 'mp4', download_nonprogressive(self.stream, 133, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-                elif chosen_stream in ['144', '144p']:
-                    merge_audio_video(self.title, '144p', 'mp4', download_nonprogressive(self.stream, 160, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-                elif chosen_stream in ['4320', '4320p', '8k']:
-                    self._handle_4320p_download(chosen_caption)
-                elif chosen_stream in ['2160', '2160p', '4k']:
-                    self._handle_2160p_download(chosen_caption)
-                elif chosen_stream in ['1440', '1440p', '2k']:
-                    self._handle_1440p_download(chosen_caption)
-                elif chosen_stream == 'mp3':
-                    convert_to_mp3(self.title, self.thumbnail, download_audio(self.stream, 140, self.temp_dir), self.author, self.video.title, self.author)
+                # The job is recorded in tempDIR until it finishes, so it can be resumed with: pytubepp -ct resume
+                save_job(self.video.video_id, link, chosen_stream, chosen_caption)
+                candidate = self.get_stream_candidate(chosen_stream)
+                video_stream, audio_stream = candidate['video'], candidate['audio']
+                with span('job', video_id=self.video.video_id, stream=candidate['res'], caption=chosen_caption):
+                    if candidate['res'] == 'mp3':
+                        output_file = convert_to_mp3(self.title, self.thumbnail, download_audio(self.stream, audio_stream.itag, self.temp_dir, self.connections, self.video.video_id), self.author, self.video.title, self.author, video_id=self.video.video_id)
+                    elif candidate['progressive']:
+                        output_file = download_progressive(self.stream, video_stream.itag, self.title, candidate['label'], candidate['ext'], self.captions, chosen_caption, connections=self.connections, video_id=self.video.video_id)
+                    else:
+                        output_file = self._download_and_merge(candidate, chosen_caption)
+                remove_job(self.video.video_id)
+                if output_file:
+                    record_download(self.video.video_id, candidate['res'], video_stream.itag if video_stream else None, audio_stream.itag, chosen_caption, output_file)
+                return output_file
             else:
                 print('\nInvalid download stream or stream not available! Please choose a different stream...!! (use -i to see available streams)')
         else:
             print('\nInvalid video link! Please enter a valid video url...!!')
 
-    def _handle_4320p_download(self, chosen_caption=None):
-        if self.stream.get_by_itag(702):
-            merge_audio_video(self.title, '8k', 'mp4', download_nonprogressive(self.stream, 702, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(571):
-            merge_audio_video(self.title, '8k', 'mp4', download_nonprogressive(self.stream, 571, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-
-    def _handle_2160p_download(self, chosen_caption=None):
-        if self.stream.get_by_itag(701):
-            merge_audio_video(self.title, '4k', 'mp4', download_nonprogressive(self.stream, 701, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(315):
-            merge_audio_video(self.title, '4k', 'webm', download_nonprogressive(self.stream, 315, 251, 'webm', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(313):
-            merge_audio_video(self.title, '4k', 'webm', download_nonprogressive(self.stream, 313, 251, 'webm', self.temp_dir), self.captions, chosen_caption)
-
-    def _handle_1440p_download(self, chosen_caption=None):
-        if self.stream.get_by_itag(700):
-            merge_audio_video(self.title, '2k', 'mp4', download_nonprogressive(self.stream, 700, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(308):
-            merge_audio_video(self.title, '2k', 'webm', download_nonprogressive(self.stream, 308, 251, 'webm', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(271):
-            merge_audio_video(self.title, '2k', 'webm', download_nonprogressive(self.stream, 271, 251, 'webm', self.temp_dir), self.captions, chosen_caption)
-
-    def _handle_1080p_download(self, chosen_caption=None):
-        if self.stream.get_by_itag(699):
-            merge_audio_video(self.title, '1080p', 'mp4', download_nonprogressive(self.stream, 699, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(299):
-            merge_audio_video(self.title, '1080p', 'mp4', download_nonprogressive(self.stream, 299, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(137):
-            merge_audio_video(self.title, '1080p', 'mp4', download_nonprogressive(self.stream, 137, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-
-    def _handle_720p_download(self, chosen_caption=None):
-        if self.stream.get_by_itag(698):
-            merge_audio_video(self.title, '720p', 'mp4', download_nonprogressive(self.stream, 698, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(298):
-            merge_audio_video(self.title, '720p', 'mp4', download_nonprogressive(self.stream, 298, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
-        elif self.stream.get_by_itag(136):
-            merge_audio_video(self.title, '720p', 'mp4', download_nonprogressive(self.stream, 136, 140, 'mp4', self.temp_dir), self.captions, chosen_caption)
+    def choose_download(self, resolved, chosen_stream=None, chosen_caption=None):
+        """Pick the stream and caption of a download without any prompts (falls back to max stream and no caption when defaults are unavailable)"""
+        allowed_streams = [alias for res in resolved['stream_index'] for alias in self.stream_resolutions[res]['allowed_streams']]
+        stream = chosen_stream or self.default_stream
+        if stream == 'max' or (stream not in allowed_streams and not chosen_stream):
+            stream = resolved['maxres']
+        if not stream or stream not in allowed_streams:
+            raise ValueError(f'Stream not available ({stream or "no downloadable video stream found"})')
+
+        caption_codes = split_captions(chosen_caption or self.default_caption)
+        if caption_codes == ['none'] or stream == 'mp3':
+            return stream, None
+        missing_captions = [code for code in caption_codes if code not in resolved['captions'].keys()]
+        if missing_captions and chosen_caption:
+            raise ValueError(f'Caption not available ({",".join(missing_captions)})')
+        # Unavailable default captions are left out
+        return stream, ','.join(code for code in caption_codes if code not in missing_captions) or None
+
+    def batch_download(self, link, chosen_stream=None, chosen_caption=None):
+        """Download a video without any prompts (falls back to max stream and no caption when defaults are unavailable)"""
+        if not self.set_video_info(link):
+            raise ValueError('Invalid video link')
+        stream, caption = self.choose_download(self.resolve_video(link), chosen_stream, chosen_caption)
+        return stream, caption, self.download_stream(link, stream, caption)
+
+    async def download_async(self, link, chosen_stream=None, chosen_caption=None, session=None):
+        """Coroutine version of batch_download running on the asyncio engine (many calls can share one event loop and session)"""
+        from .aio import create_session, download_candidate_async, run_in_thread
+        if not is_valid_url(link):
+            raise ValueError('Invalid video link')
+        resolved = await run_in_thread(self.resolve_video, link)
+        stream, caption = self.choose_download(resolved, chosen_stream, chosen_caption)
+        candidate = self.get_stream_candidate(stream, resolved['stream_index'])
+        if session:
+            return stream, caption, await download_candidate_async(session, self, link, resolved, candidate, caption)
+        async with create_session(self.connections * 2) as session:
+            return stream, caption, await download_candidate_async(session, self, link, resolved, candidate, caption)
+
+    def _download_and_merge(self, candidate, chosen_caption=None):
+        """Download the video/audio stream pair of a candidate and merge it (streamed straight into ffmpeg when streaming mux is enabled)"""
+        itag_vdo, itag_ado = candidate['video'].itag, candidate['audio'].itag
+        if self.streaming_mux and streaming_supported(candidate['video'], candidate['audio']):
+            return stream_merge_audio_video(self.stream, itag_vdo, itag_ado, self.title, candidate['label'], candidate['ext'], self.captions, chosen_caption, connections=self.connections, video_id=self.video.video_id)
+        return merge_audio_video(self.title, candidate['label'], candidate['ext'], download_nonprogressive(self.stream, itag_vdo, itag_ado, candidate['ext'], self.temp_dir, self.connections, self.video.video_id), self.captions, chosen_caption, video_id=self.video.video_id)
+
+def resume_partial_downloads(downloader):
+    jobs = load_jobs()
+    if not jobs:
+        print('No partial downloads found to resume...!')
+        return
+    for job in jobs.values():
+        rprint(f'\nResuming: {job["url"]}')
+        downloader.download_stream(job['url'], job['stream'], job['caption'])
+
+def read_batch_urls(source):
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+def get_collection_video_urls(url):
+    from pytubefix import Playlist, Channel
+    collection = Playlist(url) if 'list=' in url else Channel(url)
+    return list(collection.video_urls)
+
+def download_videos(downloader, urls, jobs, chosen_stream=None, chosen_caption=None):
+    from tabulate import tabulate
+    if not ffmpeg_installed():
+        rprint("\n[dark_orange]WARNING:[/dark_orange] FFmpeg is not installed or not found in PATH!")
+        rprint("Please install FFmpeg, by running: [green]pytubepp --postinstall[/green] or read [steel_blue3]https://github.com/neosubhamoy/pytubepp#%EF%B8%8F-installation[/steel_blue3] for manual instructions\n")
+        sys.exit()
+
+    if downloader.async_engine and not async_engine_available():
+        print('\nThe async engine needs the aiohttp package! Install it using: pip install "pytubepp[async]" or run without -ae...!!')
+        sys.exit()
+
+    # The same video listed twice would be downloaded twice into the same temporary files
+    unique_urls = {}
+    for url in urls:
+        unique_urls.setdefault(get_video_id(url) or url, url)
+    urls = list(unique_urls.values())
+
+    # Videos found in the download archive are skipped before anything is fetched for them
+    archived = {}
+    if downloader.skip_existing:
+        for url in urls:
+            archived_download = downloader.find_archived_download(url, chosen_stream, chosen_caption) if is_valid_url(url) else None
+            if archived_download:
+                archived[url] = archived_download
+
+    # Config and environment checks are shared by every job
+    if not downloader.environment_checked:
+        downloader.check_environment()
+
+    def skipped(url):
+        return [url, archived[url]['stream'], archived[url]['caption'] or 'none', 'Skipped', archived[url]['output_path']]
+
+    rprint(f'Downloading {len(urls)} videos (jobs: {jobs})...')
+    pending = [url for url in urls if url not in archived]
+    if downloader.async_engine:
+        import asyncio
+        from .aio import download_videos_async
+        # Every job shares one event loop and connection pool instead of a thread per job
+        downloaded = dict(zip(pending, asyncio.run(download_videos_async(downloader, pending, jobs, chosen_stream, chosen_caption))))
+    else:
+        from .pipeline import download_videos_pipelined
+        # ffmpeg post-processing of finished downloads overlaps the downloads of the next videos
+        downloaded = dict(zip(pending, download_videos_pipelined(downloader, pending, jobs, chosen_stream, chosen_caption,
+                                                                 lambda finished, result: rprint(f'[{finished}/{len(pending)}] {result[3]}: {result[0]}'))))
+    results = [downloaded[url] if url in downloaded else skipped(url) for url in urls]
+
+    print('\n')
+    print(tabulate(results, headers=['Video', 'Stream', 'Caption', 'Status', 'Output / Error']))
+    print(f'\n{sum(1 for result in results if result[3] == "Done")}/{len(results) - len(archived)} videos downloaded successfully!{f" ({len(archived)} already downloaded videos skipped)" if archived else ""}')
+
+def run_batch(downloader, source, jobs, chosen_stream=None, chosen_caption=None):
+    try:
+        urls = read_batch_urls(source)
+    except OSError as e:
+        print(f'\nUnable to read batch file! ({e})')
+        sys.exit()
+    if not urls:
+        print('\nNo video urls found in batch input! exiting...!!')
+        sys.exit()
+    download_videos(downloader, urls, jobs, chosen_stream, chosen_caption)
+
+def run_collection(downloader, url, jobs, chosen_stream=None, chosen_caption=None):
+    downloader.check_environment()
+    rprint('Loading...')
+    try:
+        urls = get_collection_video_urls(url)
+    except Exception as e:
+        print(f'\nUnable to load playlist or channel! ({e})')
+        sys.exit()
+    if not urls:
+        print('\nNo videos found in playlist or channel! exiting...!!')
+        sys.exit()
+    download_videos(downloader, urls, jobs, chosen_stream, chosen_caption)
 
 def main():
     downloader = YouTubeDownloader()
     
     parser = argparse.ArgumentParser(description=f'PytubePP (Pytube Post Processor) v{downloader.version} - A Simple CLI Tool to Download Your Favorite YouTube Videos Effortlessly!')
-    parser.add_argument('url', nargs='?', default=None, help='url of the youtube video')
+    parser.add_argument('url', nargs='?', default=None, help='url of the youtube video (or of a playlist or channel to download all of its videos)')
     parser.add_argument('-df', '--download-folder', default=argparse.SUPPRESS, help='set custom download folder path (default: ~/Downloads/Pytube Downloads) [arg eg: "/path/to/folder"]')
     parser.add_argument('-ds', '--default-stream', default=argparse.SUPPRESS, help='set default download stream (default: max) [available arguments: 144p, 240p, 360p, 480p, 720p, 1080p, 1440p, 2160p, 4320p, mp3, max]')
-    parser.add_argument('-dc', '--default-caption', default=argparse.SUPPRESS, help='set default caption (default: none) [available arguments: all language codes, none]')
+    parser.add_argument('-dc', '--default-caption', default=argparse.SUPPRESS, help='set default caption (default: none) [available arguments: all language codes (comma separated for multiple captions), none]')
     parser.add_argument('-s', '--stream', default=argparse.SUPPRESS, help='choose download stream for the current video (default: your chosen --default-stream) [available arguments: 144p, 240p, 360p, 480p, 720p, 1080p, 1440p, 2160p, 4320p, 144, 240, 360, 480, 720, 1080, 1440, 2160, 4320, mp3, hd, fhd, 2k, 4k, 8k]')
-    parser.add_argument('-c', '--caption', default=argparse.SUPPRESS, help='choose caption to embed for the current video (default: your chosen --default-caption) [available arguments: all language codes, none]')
+    parser.add_argument('-c', '--caption', default=argparse.SUPPRESS, help='choose caption to embed for the current video (default: your chosen --default-caption) [available arguments: all language codes (comma separated to embed multiple captions eg: en,es,a.fr), none]')
+    parser.add_argument('-b', '--batch', default=argparse.SUPPRESS, help='download all video urls listed in a file (one url per line) or "-" to read them from stdin [arg eg: "/path/to/urls.txt"]')
+    parser.add_argument('-j', '--jobs', type=int, default=3, help='number of videos to download concurrently in batch, playlist and channel mode (default: 3)')
+    parser.add_argument('-cn', '--connections', type=int, default=argparse.SUPPRESS, help='number of parallel connections used to download each stream (default: 1) (uses http range requests when greater than 1)')
+    parser.add_argument('-lr', '--limit-rate', default=argparse.SUPPRESS, help='limit the total download bandwidth shared by all streams (default: unlimited) (can also be set permanently with the maxRate config) [arg eg: 500K, 20M, 1G]')
+    parser.add_argument('-sm', '--streaming-mux', action='store_true', help='pipe video and audio streams straight into ffmpeg while downloading instead of merging them from temporary files (not resumable) (can also be enabled permanently with the streamingMux config)')
+    parser.add_argument('-ae', '--async-engine', action='store_true', help='download batch, playlist and channel videos on a single asyncio event loop instead of a thread per job (scales to hundreds of concurrent -j jobs) (can also be enabled permanently with the asyncEngine config)')
+    parser.add_argument('-se', '--skip-existing', action='store_true', help='skip videos which are already downloaded (according to the download archive) without fetching anything (can also be enabled permanently with the skipExisting config)')
+    parser.add_argument('-nnc', '--no-network-check', action='store_true', help='skip the network connectivity check before resolving videos (can also be disabled permanently with the networkCheck config)')
+    parser.add_argument('-sv', '--serve', nargs='?', const=None, default=argparse.SUPPRESS, help='run as a resident daemon with a local http job api (POST /jobs, GET /jobs/<id>, DELETE /jobs/<id>), -j sets the number of concurrent jobs (default address: your serveAddress config) [arg eg: "127.0.0.1:8765"]')
+    parser.add_argument('-sb', '--submit', action='store_true', help='submit the download to a running pytubepp daemon instead of downloading in this process')
+    parser.add_argument('-w', '--wait', action='store_true', help='wait until the submitted download is finished (must be used with -sb)')
+    parser.add_argument('-mf', '--metrics-file', default=argparse.SUPPRESS, help='append timing and throughput metrics of every job stage (resolve, transfer, ffmpeg, finalize...) to a file as json lines [arg eg: "/path/to/metrics.jsonl"]')
+    parser.add_argument('-pf', '--profile', action='store_true', help='print a summary of where the time went (per job stage) when finished')
     parser.add_argument('-i', '--show-info', action='store_true', help='show video info (title, author, views and available_streams)')
     parser.add_argument('-ls', '--list-stream', action='store_true', help='list all available streams (video, audio, caption) (only for debuging purposes)')
     parser.add_argument('-ri', '--raw-info', action='store_true', help='show video info in raw json format')
     parser.add_argument('-jp', '--json-prettify', action='store_true', help='show json in prettified indented view')
+    parser.add_argument('-o', '--offline', action='store_true', help='serve video info (-i, -ri, -ls) from the local cache without using the network')
     parser.add_argument('-sc', '--show-config', action='store_true', help='show all current user config settings')
     parser.add_argument('-r', '--reset-default', action='store_true', help='reset to default settings (download_folder and default_stream)')
-    parser.add_argument('-ct', '--clear-temp', action='store_true', help='clear temporary files (audio, video, thumbnail files of the failed, incomplete downloads)')
+    parser.add_argument('-ct', '--clear-temp', nargs='?', const='all', default=None, choices=['all', 'list', 'resume', 'expire'], help='manage temporary files of the failed, incomplete downloads (default: all) [available arguments: all (clear all temporary files), list (list partial downloads), resume (resume partial downloads), expire (clear partial downloads older than tempExpiry days)]')
     parser.add_argument('-pi', '--postinstall', action='store_true', help='auto install external dependencies (supported os: windows, linux - debian fedora arch, macos)')
     parser.add_argument('-v', '--version', action='store_true', help='show version number')
     args = parser.parse_args()
@@ -414,7 +552,58 @@ def main():
         parser.print_help()
         sys.exit(1)
     
-    if args.url:
+    if hasattr(args, 'metrics_file') or args.profile:
+        enable_metrics(getattr(args, 'metrics_file', None))
+        if args.profile:
+            atexit.register(print_profile)
+
+    if hasattr(args, 'connections'):
+        if args.connections < 1:
+            print('\nInvalid number of connections! Please enter a number greater than 0...!!')
+            sys.exit()
+        downloader.connections = args.connections
+
+    max_rate = getattr(args, 'limit_rate', downloader.user_config['maxRate'])
+    if max_rate:
+        rate = parse_rate(max_rate)
+        if not rate:
+            print('\nInvalid download rate limit! Please enter a rate like 500K, 20M or 1G...!!')
+            sys.exit()
+        set_rate_limit(rate, downloader.user_config['sharedRateLimit'])
+
+    if args.streaming_mux:
+        downloader.streaming_mux = True
+
+    if args.skip_existing:
+        downloader.skip_existing = True
+
+    if args.async_engine:
+        downloader.async_engine = True
+
+    if args.no_network_check:
+        downloader.network_check = False
+
+    if args.jobs < 1:
+        print('\nInvalid number of jobs! Please enter a number greater than 0...!!')
+        sys.exit()
+
+    if hasattr(args, 'serve'):
+        serve(downloader, args.serve or downloader.user_config['serveAddress'], args.jobs)
+    elif args.submit:
+        if not args.url or not is_valid_url(args.url):
+            print('\nInvalid video link! Please enter a valid video url...!!')
+            sys.exit()
+        submit_to_daemon(downloader.user_config['serveAddress'], args.url, getattr(args, 'stream', None), getattr(args, 'caption', None), args.wait)
+    elif hasattr(args, 'batch'):
+        if args.url:
+            print('\nBatch file supplied! ignoring video url...!!')
+        run_batch(downloader, args.batch, args.jobs, getattr(args, 'stream', None), getattr(args, 'caption', None))
+    elif args.url and is_collection_url(args.url):
+        if any([args.show_info, args.raw_info, args.list_stream, args.offline]):
+            print('\nPlaylist or channel url supplied! ignoring -i, -ri, -ls and -o flags...!!')
+        run_collection(downloader, args.url, args.jobs, getattr(args, 'stream', None), getattr(args, 'caption', None))
+    elif args.url:
+        downloader.offline = args.offline
         if not is_valid_url(args.url):
             print('\nInvalid video link! Please enter a valid video url...!!')
             sys.exit()
@@ -447,16 +636,26 @@ def main():
         if args.json_prettify and not args.raw_info:
             print('\nMissing flag! -jp flag must be used with a flag which returns json data...!! (eg: -ri)')
         
+        if args.offline and (hasattr(args, 'stream') or hasattr(args, 'caption') or not any([args.show_info, args.raw_info, args.json_prettify, args.list_stream])):
+            print('\nDownloading is not possible in offline mode! Please run without --offline flag...!!')
+            sys.exit()
+
+        if downloader.skip_existing and (hasattr(args, 'stream') or hasattr(args, 'caption') or not any([args.show_info, args.raw_info, args.json_prettify, args.list_stream])):
+            archived_download = downloader.find_archived_download(args.url, getattr(args, 'stream', None), getattr(args, 'caption', None))
+            if archived_download:
+                print(f'\nVideo already downloaded! skipping...!! ({archived_download["output_path"]})')
+                return
+
         # Handle download cases
         if hasattr(args, 'stream') and hasattr(args, 'caption'):
             rprint('Loading...')
             if downloader.set_video_info(args.url):
-                if (args.caption not in downloader.captions.keys()) and (args.caption != 'none'):
+                if not downloader.captions_available(args.caption) and (args.caption != 'none'):
                     print('\nInvalid caption code or caption not available! Please choose a different caption...!! (use -i to see available captions)')
                     sys.exit()
                 elif args.caption == 'none':
                     downloader.download_stream(args.url, args.stream)
-                elif args.stream == 'mp3' and downloader.stream.get_by_itag(140):
+                elif args.stream == 'mp3' and downloader.stream_available('mp3'):
                     print(f'\nYou have chosen to download mp3 stream! ( Captioning audio files is not supported )')
                     answer = input('Do you still want to continue downloading? [yes/No]: ').strip().lower()
                     if answer in ['yes', 'y']:
@@ -470,14 +669,14 @@ def main():
             if downloader.set_video_info(args.url):
                 if downloader.default_caption == 'none':
                     downloader.download_stream(args.url, args.stream)
-                elif args.stream == 'mp3' and downloader.stream.get_by_itag(140):
+                elif args.stream == 'mp3' and downloader.stream_available('mp3'):
                         print(f'\nYou have chosen to download mp3 stream! ( Captioning audio files is not supported )')
                         answer = input('Do you still want to continue downloading? [yes/No]: ').strip().lower()
                         if answer in ['yes', 'y']:
                             downloader.download_stream(args.url, args.stream)
                         else:
                             print('Download cancelled! exiting...!!')
-                elif downloader.default_caption in downloader.captions.keys():
+                elif downloader.captions_available(downloader.default_caption):
                     downloader.download_stream(args.url, args.stream, downloader.default_caption)
                 else:
                     print(f'\nDefault caption not available! ( Default: {downloader.default_caption} | Available: {[caption.code for caption in downloader.captions.keys()] or "Nothing"} )')
@@ -489,15 +688,15 @@ def main():
         elif hasattr(args, 'caption'):
             rprint('Loading...')
             if downloader.set_video_info(args.url):
-                if (args.caption not in downloader.captions.keys()) and (args.caption != 'none'):
+                if not downloader.captions_available(args.caption) and (args.caption != 'none'):
                     print('\nInvalid caption code or caption not available! Please choose a different caption...!! (use -i to see available captions)')
                     sys.exit()
                 elif args.caption == 'none':
                     if downloader.default_stream == 'max' and downloader.maxres:
                         downloader.download_stream(args.url, downloader.maxres)
-                    elif downloader.default_stream == 'mp3' and downloader.stream.get_by_itag(140):
+                    elif downloader.default_stream == 'mp3' and downloader.stream_available('mp3'):
                         downloader.download_stream(args.url, downloader.default_stream)
-                    elif downloader.default_stream != 'max' and downloader.stream.filter(res=downloader.default_stream):
+                    elif downloader.default_stream != 'max' and downloader.stream_available(downloader.default_stream):
                         downloader.download_stream(args.url, downloader.default_stream)
                     else:
                         if downloader.maxres:
@@ -511,14 +710,14 @@ def main():
                             print('Sorry, No downloadable video stream found....!!!')
                 elif downloader.default_stream == 'max' and downloader.maxres:
                     downloader.download_stream(args.url, downloader.maxres, args.caption)
-                elif downloader.default_stream == 'mp3' and downloader.stream.get_by_itag(140):
+                elif downloader.default_stream == 'mp3' and downloader.stream_available('mp3'):
                         print(f'\nDefault stream set to mp3! ( Captioning audio files is not supported )')
                         answer = input('Do you still want to continue downloading? [yes/No]: ').strip().lower()
                         if answer in ['yes', 'y']:
                             downloader.download_stream(args.url, downloader.default_stream)
                         else:
                             print('Download cancelled! exiting...!!')
-                elif downloader.default_stream != 'max' and downloader.stream.filter(res=downloader.default_stream):
+                elif downloader.default_stream != 'max' and downloader.stream_available(downloader.default_stream):
                     downloader.download_stream(args.url, downloader.default_stream, args.caption)
                 else:
                     if downloader.maxres:
@@ -536,7 +735,7 @@ def main():
                 if downloader.default_stream == 'max' and downloader.maxres:
                     if downloader.default_caption == 'none':
                         downloader.download_stream(args.url, downloader.maxres)
-                    elif downloader.default_caption in downloader.captions.keys():
+                    elif downloader.captions_available(downloader.default_caption):
                         downloader.download_stream(args.url, downloader.maxres, downloader.default_caption)
                     else:
                         print(f'\nDefault caption not available! ( Default: {downloader.default_caption} | Available: {[caption.code for caption in downloader.captions.keys()] or "Nothing"} )')
@@ -545,17 +744,17 @@ def main():
                             downloader.download_stream(args.url, downloader.maxres)
                         else:
                             print('Download cancelled! exiting...!!')
-                elif (downloader.default_stream == 'mp3' and downloader.stream.get_by_itag(140)) or (downloader.default_stream != 'max' and downloader.stream.filter(res=downloader.default_stream)):
+                elif (downloader.default_stream == 'mp3' and downloader.stream_available('mp3')) or (downloader.default_stream != 'max' and downloader.stream_available(downloader.default_stream)):
                     if downloader.default_caption == 'none':
                         downloader.download_stream(args.url, downloader.default_stream)
-                    elif downloader.default_stream == 'mp3' and downloader.stream.get_by_itag(140):
+                    elif downloader.default_stream == 'mp3' and downloader.stream_available('mp3'):
                         print(f'\nDefault stream set to mp3! ( Captioning audio files is not supported )')
                         answer = input('Do you still want to continue downloading? [yes/No]: ').strip().lower()
                         if answer in ['yes', 'y']:
                             downloader.download_stream(args.url, downloader.default_stream)
                         else:
                             print('Download cancelled! exiting...!!')
-                    elif downloader.default_caption in downloader.captions.keys():
+                    elif downloader.captions_available(downloader.default_caption):
                         downloader.download_stream(args.url, downloader.default_stream, downloader.default_caption)
                     else:
                         print(f'\nDefault caption not available! ( Default: {downloader.default_caption} | Available: {[caption.code for caption in downloader.captions.keys()] or "Nothing"} )')
@@ -571,7 +770,7 @@ def main():
                         if answer in ['yes', 'y']:
                             if downloader.default_caption == 'none':
                                 downloader.download_stream(args.url, downloader.maxres)
-                            elif downloader.default_caption in downloader.captions.keys():
+                            elif downloader.captions_available(downloader.default_caption):
                                 downloader.download_stream(args.url, downloader.maxres, downloader.default_caption)
                             else:
                                 print(f'\nDefault caption not available! ( Default: {downloader.default_caption} | Available: {[caption.code for caption in downloader.captions.keys()] or "Nothing"} )')
@@ -608,27 +807,35 @@ def main():
         
         if hasattr(args, 'default_caption'):
             if args.default_caption != downloader.default_caption:
-                if not (re.match(r'^[a-z]{2}(-[A-Za-z]+)?$', args.default_caption) or
-                        re.match(r'^a\.[a-z]{2}(-[A-Za-z]+)?$', args.default_caption) or
-                        re.match(r'^none$', args.default_caption)):
+                default_captions = split_captions(args.default_caption)
+                if not default_captions or (default_captions != ['none'] and not all(
+                        re.match(r'^[a-z]{2}(-[A-Za-z]+)?$', code) or
+                        re.match(r'^a\.[a-z]{2}(-[A-Za-z]+)?$', code) for code in default_captions)):
                     print('\nInvalid caption code! Allowed formats are:\n'
                         '- ISO 639-1 language codes (e.g: en, zh-Hans)\n'
                         '- Auto-generated variants: a.ISO639-1LanguageCode (e.g: a.en, a.zh-Hans)\n'
+                        '- Multiple codes separated by commas (e.g: en,es,a.fr)\n'
                         '- none\n')
                 else:
-                    update_config('defaultCaption', args.default_caption)
-                    print(f'\nDefault caption updated to: {args.default_caption}')
+                    update_config('defaultCaption', default_captions if len(default_captions) > 1 else default_captions[0])
+                    print(f'\nDefault caption updated to: {",".join(default_captions)}')
             else:
                 print('\nDefault caption is the same! Not updating...!!')
         
         if args.reset_default:
             reset_config()
         
-        if args.clear_temp:
+        if args.clear_temp == 'all':
             clear_temp_files()
+        elif args.clear_temp == 'list':
+            list_partial_downloads()
+        elif args.clear_temp == 'resume':
+            resume_partial_downloads(downloader)
+        elif args.clear_temp == 'expire':
+            expire_partial_downloads(downloader.user_config['tempExpiry'])
 
         if args.show_config:
-            print(f'\ntempDIR: {downloader.temp_dir} (Unchangeable) \nconfigDIR: {downloader.config_dir} (Unchangeable)\ndownloadDIR: {downloader.download_dir}\ndefaultStream: {downloader.default_stream}\ndefaultCaption: {downloader.default_caption}\n')
+            print(f'\nstagingDIR: {get_temporary_directory(create=False)}\nconfigDIR: {downloader.config_dir} (Unchangeable)\ndownloadDIR: {downloader.download_dir}\ndefaultStream: {downloader.default_stream}\ndefaultCaption: {downloader.default_caption}\ninfoCacheTTL: {downloader.info_cache_ttl} seconds\ninfoCacheSize: {downloader.info_cache_size} videos\nthumbnailCacheSize: {downloader.user_config["thumbnailCacheSize"]} bytes\ncaptionCacheSize: {downloader.user_config["captionCacheSize"]} captions\nconnections: {downloader.connections}\nsegmentSize: {downloader.user_config["segmentSize"]} bytes\nhttpPoolSize: {downloader.user_config["httpPoolSize"]} connections (timeout: {downloader.user_config["httpTimeout"]} seconds, retries: {downloader.user_config["httpRetries"]})\nmaxRate: {downloader.user_config["maxRate"] or "unlimited"} (shared across processes: {downloader.user_config["sharedRateLimit"]})\nstreamingMux: {downloader.streaming_mux}\nasyncEngine: {downloader.async_engine}\ntempExpiry: {downloader.user_config["tempExpiry"]} days\nresolveWorkers: {downloader.resolve_workers}\nmuxWorkers: {downloader.user_config["muxWorkers"]} (pipeline buffer: {downloader.user_config["pipelineBuffer"]} videos)\nskipExisting: {downloader.skip_existing} (verify files: {downloader.archive_verify})\nserveAddress: {downloader.user_config["serveAddress"]} (finished jobs are kept for {downloader.user_config["serveJobTTL"]} seconds, up to {downloader.user_config["serveMaxJobs"]} jobs)\nnetworkCheck: {downloader.network_check}\nupdateCheck: {downloader.user_config["updateCheck"]} (every {downloader.user_config["updateCheckInterval"]} seconds)\n')
 
         if args.postinstall:
             postinstall()
@@ -0,0 +1,106 @@
+import contextvars, json, threading, time
+
+# Instrumentation is off unless --metrics-file or --profile is used, then every span is kept in records
+# and appended to the metrics file as a JSON line. Disabled spans are a shared no-op object
+enabled = False
+metrics_file = None
+records = []
+records_lock = threading.Lock()
+current_span = contextvars.ContextVar('current_span', default=None)
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    """Timed stage of a job, bytes transferred inside it (see add_bytes) are counted for it and its parent spans"""
+    def __init__(self, name, fields):
+        self.record = {'span': name, **fields}
+        self.bytes = 0
+        self.first_byte = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.parent = current_span.get()
+        self.token = current_span.set(self)
+        self.record['start'] = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started
+        current_span.reset(self.token)
+        self.record['duration'] = round(duration, 6)
+        if self.bytes:
+            self.record['bytes'] = self.bytes
+            self.record['throughput'] = round(self.bytes / duration) if duration else None
+            self.record['ttfb'] = round(self.first_byte, 6)
+        if exc_type:
+            self.record['error'] = exc_type.__name__
+        emit(self.record)
+        return False
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def add_bytes(self, amount):
+        with self.lock:
+            if self.first_byte is None:
+                self.first_byte = time.perf_counter() - self.started
+            self.bytes += amount
+        if self.parent:
+            self.parent.add_bytes(amount)
+
+def span(name, **fields):
+    return Span(name, fields) if enabled else NULL_SPAN
+
+def count_bytes(amount):
+    # Called from transferred() for every downloaded chunk
+    active_span = current_span.get()
+    if active_span:
+        active_span.add_bytes(amount)
+
+def emit(record):
+    with records_lock:
+        records.append(record)
+        if metrics_file:
+            try:
+                with open(metrics_file, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+            except OSError as e:
+                print(f'\nUnable to write metrics file! ({e})')
+
+def enable_metrics(file_path=None):
+    global enabled, metrics_file
+    enabled = True
+    metrics_file = file_path
+
+def print_profile():
+    from tabulate import tabulate
+    from .utils import format_filesize
+    summary = {}
+    with records_lock:
+        for record in records:
+            entry = summary.setdefault(record['span'], {'count': 0, 'duration': 0, 'bytes': 0, 'ttfb': []})
+            entry['count'] += 1
+            entry['duration'] += record['duration']
+            entry['bytes'] += record.get('bytes', 0)
+            if 'ttfb' in record:
+                entry['ttfb'].append(record['ttfb'])
+    if not summary:
+        return
+    table = []
+    for name, entry in sorted(summary.items(), key=lambda item: -item[1]['duration']):
+        table.append([name, entry['count'], f"{entry['duration']:.3f}s", format_filesize(entry['bytes']) if entry['bytes'] else '-',
+                      f"{format_filesize(entry['bytes'] / entry['duration'])}/s" if entry['bytes'] and entry['duration'] else '-',
+                      f"{sum(entry['ttfb']) * 1000 / len(entry['ttfb']):.0f}ms" if entry['ttfb'] else '-'])
+    print('\nProfile (spans can overlap, nested spans are included in their parents):')
+    print(tabulate(table, headers=['Span', 'Count', 'Total Time', 'Bytes', 'Throughput', 'Avg TTFB']))
\ No newline at end of file
@@ -0,0 +1,183 @@
+from .utils import get_unique_filename, postprocess_cleanup, finalize_output_file, save_job, remove_job, is_valid_url
+from .download import download_nonprogressive, download_audio, download_with_progress, download_thumbnail, get_temp_filename, streaming_supported, in_context, stop_events, progress_slot
+from .postprocess import get_mp3_output_args, get_output_file, stream_merge_audio_video
+from .subtitles import prepare_caption, get_caption_suffixes
+from .archive import record_download
+from .metrics import span
+import os, queue, threading
+
+# Batch downloads run as a pipeline of stages (resolve -> fetch -> mux -> finalize), each with its own worker threads,
+# so ffmpeg works on one video while the next ones are downloading. Stages hand jobs over through bounded queues: when
+# the mux stage falls behind, fetch workers wait with their finished downloads instead of starting new ones, which
+# keeps the number of jobs holding temporary files (and so the temporary disk usage) bounded
+
+def run_pipeline(items, stages, on_done, on_error):
+    """Run every item through the stages, a list of (name, fn, workers, buffer) where fn(item) returns the item for the next stage
+    and buffer is the size of the queue feeding the stage (0: unbounded). Items whose stage raises go to on_error(item, error) instead"""
+    queues = [queue.Queue(maxsize=buffer) for _, _, _, buffer in stages]
+    remaining_workers = [workers for _, _, workers, _ in stages]
+    state_lock = threading.Lock()
+    stop_event = threading.Event()
+
+    def worker(index):
+        name, fn, _, _ = stages[index]
+        while True:
+            item = queues[index].get()
+            if item is None or stop_event.is_set():
+                break
+            try:
+                with span(name + '_stage'):
+                    item = fn(item)
+            except (Exception, SystemExit) as e:
+                with state_lock:
+                    on_error(item, e)
+                continue
+            if index + 1 < len(stages):
+                # Blocks while the next stage is full (backpressure)
+                queues[index + 1].put(item)
+            else:
+                with state_lock:
+                    on_done(item)
+        # The last worker of a stage to finish shuts the next stage down
+        with state_lock:
+            remaining_workers[index] -= 1
+            last_worker = remaining_workers[index] == 0
+        if last_worker and index + 1 < len(stages):
+            for _ in range(stages[index + 1][2]):
+                queues[index + 1].put(None)
+
+    # Workers see the stop event through their context, like the transfer pools they start (see run_workers)
+    token = stop_events.set(stop_events.get() + (stop_event,))
+    threads = [threading.Thread(target=in_context(worker), args=(index,), daemon=True) for index, (_, _, workers, _) in enumerate(stages) for _ in range(workers)]
+    stop_events.reset(token)
+    try:
+        for thread in threads:
+            thread.start()
+        for item in items:
+            queues[0].put(item)
+        for _ in range(stages[0][2]):
+            queues[0].put(None)
+        for thread in threads:
+            thread.join()
+    except BaseException:
+        # Interrupted (Ctrl+C): running transfers stop at their next chunk and no stage picks up another job
+        stop_event.set()
+        raise
+
+def resolve_job(downloader, job):
+    if not is_valid_url(job['url']):
+        raise ValueError('Invalid video link')
+    resolved = downloader.resolve_video(job['url'])
+    job['stream'], job['caption'] = downloader.choose_download(resolved, job['stream'], job['caption'])
+    job['resolved'], job['candidate'] = resolved, downloader.get_stream_candidate(job['stream'], resolved['stream_index'])
+    # The job is recorded in tempDIR until it finishes, so it can be resumed with: pytubepp -ct resume
+    save_job(resolved['video'].video_id, job['url'], job['stream'], job['caption'])
+    return job
+
+def fetch_job(downloader, job):
+    """Download the streams (and thumbnail or captions) of a job into tempDIR and work out its ffmpeg command"""
+    resolved, candidate, caption_code = job['resolved'], job['candidate'], job['caption']
+    video_id, tempDIR, connections = resolved['video'].video_id, downloader.temp_dir, downloader.connections
+    video_stream, audio_stream, file_extention = candidate['video'], candidate['audio'], candidate['ext']
+
+    if candidate['res'] == 'mp3':
+        from concurrent.futures import ThreadPoolExecutor
+        random_filename = get_temp_filename(video_id, audio_stream.itag)
+        image_file = os.path.join(tempDIR, random_filename + '_thumbnail.jpg')
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            audio = executor.submit(in_context(download_audio), resolved['stream'], audio_stream.itag, tempDIR, connections, video_id)
+            cover = executor.submit(in_context(download_thumbnail), resolved['thumbnail'], image_file, video_id)
+            audio.result()
+            has_cover = cover.result()
+        audio_file = os.path.join(tempDIR, random_filename + '_ado.mp4')
+        job['inputs'] = [audio_file, image_file] if has_cover else [audio_file]
+        job['output_args'] = get_mp3_output_args(resolved['author'], resolved['video'].title, resolved['author'], has_cover)
+        job['cleanup'] = ['_thumbnail.jpg', '_ado.mp4', '_merged.mp3']
+        job['source'] = os.path.join(tempDIR, random_filename + '_merged.mp3')
+    elif not candidate['progressive'] and downloader.streaming_mux and streaming_supported(video_stream, audio_stream):
+        # Streaming mux downloads and merges in one go, so there is nothing left for the mux stage
+        job['output_file'] = stream_merge_audio_video(resolved['stream'], video_stream.itag, audio_stream.itag, resolved['title'], candidate['label'], file_extention, resolved['captions'], caption_code, tempDIR, downloader.download_dir, connections, video_id)
+        job['inputs'], job['source'], job['cleanup'] = None, None, []
+        random_filename = None
+    else:
+        random_filename = get_temp_filename(video_id, video_stream.itag)
+        video_file = os.path.join(tempDIR, random_filename + '_vdo.' + file_extention)
+        if candidate['progressive']:
+            download_with_progress(video_stream, tempDIR, os.path.basename(video_file), 'Downloading Video+Audio', connections=connections)
+            job['inputs'] = [video_file]
+        else:
+            download_nonprogressive(resolved['stream'], video_stream.itag, audio_stream.itag, file_extention, tempDIR, connections, video_id)
+            job['inputs'] = [video_file, os.path.join(tempDIR, random_filename + '_ado.' + file_extention)]
+        job['output_args'] = prepare_caption(resolved['captions'], caption_code, tempDIR, random_filename, file_extention, video_id, len(job['inputs'])) if caption_code else ['-c:v', 'copy', '-c:a', 'copy']
+        job['cleanup'] = ['_vdo.' + file_extention, '_ado.' + file_extention, '_merged.' + file_extention] + get_caption_suffixes(caption_code)
+        job['source'] = os.path.join(tempDIR, random_filename + '_merged.' + file_extention)
+        if candidate['progressive'] and not caption_code:
+            # Nothing to mux, the downloaded stream already is the output file
+            job['inputs'], job['source'] = None, video_file
+    job['random_filename'] = random_filename
+    return job
+
+def mux_job(job):
+    import ffmpy
+    if job['inputs']:
+        ff = ffmpy.FFmpeg(global_options=['-y'], inputs={input_file: None for input_file in job['inputs']}, outputs={job['source']: job['output_args']})
+        with open(os.devnull, 'w') as devnull, span('ffmpeg', output=os.path.basename(job['source'])):
+            ff.run(stdout=devnull, stderr=devnull)
+        # Jobs waiting for the finalize stage only hold their output file
+        for input_file in job['inputs']:
+            os.remove(input_file)
+    return job
+
+def finalize_job(downloader, job):
+    resolved, candidate = job['resolved'], job['candidate']
+    if job['source']:
+        if candidate['res'] == 'mp3':
+            job['output_file'] = os.path.join(downloader.download_dir, get_unique_filename(resolved['title'] + '_audio.mp3', downloader.download_dir))
+        else:
+            job['output_file'] = get_output_file(resolved['title'], candidate['label'], candidate['ext'], job['caption'], downloader.download_dir)
+        job['output_file'] = finalize_output_file(job['source'], job['output_file'])
+        postprocess_cleanup(downloader.temp_dir, job['cleanup'], job['random_filename'])
+    video_id = resolved['video'].video_id
+    remove_job(video_id)
+    record_download(video_id, candidate['res'], candidate['video'].itag if candidate['video'] else None, candidate['audio'].itag, job['caption'], job['output_file'])
+    return job
+
+def download_videos_pipelined(downloader, urls, jobs, chosen_stream=None, chosen_caption=None, on_result=None):
+    """Download many videos through the resolve -> fetch -> mux -> finalize pipeline, returns a summary row per url (in order)"""
+    config = downloader.user_config
+    results = {}
+
+    def report(url, result):
+        results[url] = result
+        if on_result:
+            on_result(len(results), result)
+
+    def on_done(job):
+        report(job['url'], [job['url'], job['stream'], job['caption'] or 'none', 'Done', job['output_file']])
+
+    def on_error(job, error):
+        message = 'Aborted' if isinstance(error, SystemExit) else str(error) or error.__class__.__name__
+        report(job['url'], [job['url'], chosen_stream or '-', chosen_caption or '-', 'Failed', message])
+
+    # Every fetch worker draws its progress bars on rows of its own (one per stream), labelled with the video id
+    slots = queue.Queue()
+    for slot in range(jobs):
+        slots.put(slot)
+
+    def fetch(job):
+        slot = slots.get()
+        token = progress_slot.set((slot * 2, job['resolved']['video'].video_id))
+        try:
+            return fetch_job(downloader, job)
+        finally:
+            progress_slot.reset(token)
+            slots.put(slot)
+
+    buffer = config['pipelineBuffer']
+    run_pipeline([{'url': url, 'stream': chosen_stream, 'caption': chosen_caption} for url in urls], [
+        ('resolve', lambda job: resolve_job(downloader, job), downloader.resolve_workers, 0),
+        ('fetch', fetch, jobs, max(jobs, 1)),
+        ('mux', mux_job, config['muxWorkers'], buffer),
+        ('finalize', lambda job: finalize_job(downloader, job), 1, buffer)
+    ], on_done, on_error)
+    return [results[url] for url in urls]
\ No newline at end of file
@@ -1,115 +1,157 @@
-from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB
 from .config import get_temporary_directory, load_config
-from .utils import get_unique_filename, postprocess_cleanup, unpack_caption
-from .download import download_thumbnail
-import os, shutil, ffmpy
+from .utils import get_unique_filename, postprocess_cleanup, finalize_output_file
+from .subtitles import prepare_caption, split_captions, get_caption_suffixes
+from .download import download_nonprogressive, download_thumbnail, get_temp_filename, stream_to_pipe, in_context
+from .metrics import span
+import os, subprocess, threading
 
-userConfig = load_config()
-downloadDIR = userConfig['downloadDIR']
-tempDIR = get_temporary_directory()
+def get_mp3_output_args(mp3_artist='Unknown', mp3_title='Unknown', mp3_album='Unknown', cover=True):
+    # Transcode the audio, attach the cover art (the second input) and write the ID3 tags in a single ffmpeg pass,
+    # without the source container's tags (major_brand, encoder...) or ffmpeg's own encoder tag
+    output_args = ['-map', '0:a', '-map_metadata', '-1', '-fflags', '+bitexact', '-c:a', 'libmp3lame', '-q:a', '2', '-id3v2_version', '3',
+                   '-metadata', f'title={mp3_title}', '-metadata', f'artist={mp3_artist}', '-metadata', f'album={mp3_album}']
+    if cover:
+        output_args += ['-map', '1:v', '-c:v', 'copy', '-disposition:v', 'attached_pic',
+                        '-metadata:s:v', 'title=Cover', '-metadata:s:v', 'comment=Cover (front)']
+    return output_args
 
-def merge_audio_video(title, resolution, file_extention, random_filename, captions, caption_code=None, tempDIR=tempDIR, downloadDIR=downloadDIR):
+def get_output_file(title, resolution, file_extention, caption_code=None, downloadDIR=None):
+    downloadDIR = downloadDIR or load_config()['downloadDIR']
+    if caption_code:
+        return os.path.join(downloadDIR, get_unique_filename(title + '_' + resolution + '_' + '_'.join(split_captions(caption_code)) + '.' + file_extention, downloadDIR))
+    return os.path.join(downloadDIR, get_unique_filename(title + '_' + resolution + '.' + file_extention, downloadDIR))
+
+def get_stream_types(file_path):
+    """Types (Video, Audio, Subtitle...) of the streams ffmpeg finds in a file"""
+    # ffmpeg -i without an output exits with an error, but still lists the streams of the input
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-i', file_path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors='replace')
+    return [line.split(': ')[1] for line in result.stderr.splitlines() if line.strip().startswith('Stream #') and ': ' in line]
+
+def merge_audio_video(title, resolution, file_extention, random_filename, captions, caption_code=None, tempDIR=None, downloadDIR=None, video_id=None):
+    import ffmpy
+    tempDIR = tempDIR or get_temporary_directory()
     video_file = os.path.join(tempDIR, random_filename + '_vdo.' + file_extention)
     audio_file = os.path.join(tempDIR, random_filename + '_ado.' + file_extention)
     output_temp_file = os.path.join(tempDIR, random_filename + '_merged.' + file_extention)
-    output_file = os.path.join(downloadDIR, get_unique_filename(title + '_' + resolution + '.' + file_extention)) if not caption_code else os.path.join(downloadDIR, get_unique_filename(title + '_' + resolution + '_' + caption_code + '.' + file_extention))
-    
-    if caption_code:
-        print(f'Downloading Caption ({caption_code})...')
-        caption = captions[caption_code]
-        _, caption_lang = unpack_caption(caption)
-        srt_file = os.path.join(tempDIR, random_filename + '_cap.srt')
-        caption.save_captions(srt_file)
-        vtt_file = os.path.join(tempDIR, random_filename + '_cap.vtt')
-
-        print('Processing...')
-        if file_extention == 'webm':
-            devnull = open(os.devnull, 'w')
-            ff_convert = ffmpy.FFmpeg(
-                inputs={srt_file: None},
-                outputs={vtt_file: None}
-            )
-            ff_convert.run(stdout=devnull, stderr=devnull)
-            subtitle_file = vtt_file
-            subtitle_codec = 'webvtt'
-        else:
-            subtitle_file = srt_file
-            subtitle_codec = 'mov_text'
-        
-        input_params = {video_file: None, audio_file: None}
-        output_params = {output_temp_file: ['-i', subtitle_file, '-c:v', 'copy', '-c:a', 'copy', 
-                        '-c:s', subtitle_codec, '-metadata:s:s:0', f'language={caption_code}',
-                        '-metadata:s:s:0', f'title={caption_lang}', '-metadata:s:s:0', f'handler_name={caption_lang}']}
-        
-        devnull = open(os.devnull, 'w')
-        ff = ffmpy.FFmpeg(inputs=input_params, outputs=output_params)
-        ff.run(stdout=devnull, stderr=devnull)
-        devnull.close()
+    output_file = get_output_file(title, resolution, file_extention, caption_code, downloadDIR)
+    output_args = prepare_caption(captions, caption_code, tempDIR, random_filename, file_extention, video_id) if caption_code else ['-c:v', 'copy', '-c:a', 'copy']
 
-        shutil.move(output_temp_file, output_file)
-        cleanup_files = ['_vdo.' + file_extention, '_ado.' + file_extention, '_cap.srt', '_merged.' + file_extention]
-        if file_extention == 'webm':
-            cleanup_files.append('_cap.vtt')
-        postprocess_cleanup(tempDIR, cleanup_files, random_filename)
-        print('Done! 🎉')
-    else:
-        input_params = {video_file: None, audio_file: None}
-        output_params = {output_temp_file: ['-c:v', 'copy', '-c:a', 'copy']}
-
-        print('Processing...')
-        devnull = open(os.devnull, 'w')
-        ff = ffmpy.FFmpeg(inputs=input_params, outputs=output_params)
+    print('Processing...')
+    devnull = open(os.devnull, 'w')
+    ff = ffmpy.FFmpeg(global_options=['-y'], inputs={video_file: None, audio_file: None}, outputs={output_temp_file: output_args})
+    with span('ffmpeg', output=os.path.basename(output_file)):
         ff.run(stdout=devnull, stderr=devnull)
+    devnull.close()
+
+    output_file = finalize_output_file(output_temp_file, output_file)
+    postprocess_cleanup(tempDIR, ['_vdo.' + file_extention, '_ado.' + file_extention, '_merged.' + file_extention] + get_caption_suffixes(caption_code), random_filename)
+    print('Done! 🎉')
+    return output_file
+
+def stream_merge_audio_video(stream, itag_vdo, itag_ado, title, resolution, file_extention, captions, caption_code=None, tempDIR=None, downloadDIR=None, connections=1, video_id=None):
+    """Merge a video/audio stream pair while it downloads, by piping both streams straight into ffmpeg (no temporary stream files)"""
+    import ffmpy
+    tempDIR = tempDIR or get_temporary_directory()
+    selected_vdo = stream.get_by_itag(itag_vdo)
+    selected_ado = stream.get_by_itag(itag_ado)
+    random_filename = get_temp_filename(video_id, itag_vdo)
+    output_file = get_output_file(title, resolution, file_extention, caption_code, downloadDIR)
+    output_temp_file = os.path.join(tempDIR, random_filename + '_merged.' + file_extention)
+    output_args = prepare_caption(captions, caption_code, tempDIR, random_filename, file_extention, video_id) if caption_code else ['-c:v', 'copy', '-c:a', 'copy']
+
+    pipes = []
+    for suffix in ['_vdo.pipe', '_ado.pipe']:
+        pipe_path = os.path.join(tempDIR, random_filename + suffix)
+        if os.path.exists(pipe_path):
+            os.remove(pipe_path)
+        os.mkfifo(pipe_path)
+        pipes.append(pipe_path)
+
+    devnull = open(os.devnull, 'w')
+    ff = ffmpy.FFmpeg(global_options=['-y'], inputs={pipes[0]: None, pipes[1]: None}, outputs={output_temp_file: output_args})
+    stop_event = threading.Event()
+    errors = []
+
+    def feed(selected_stream, pipe_path, desc, position):
+        try:
+            with span('transfer', file=os.path.basename(pipe_path), itag=selected_stream.itag, size=selected_stream.filesize, connections=connections, streaming=True):
+                stream_to_pipe(selected_stream, pipe_path, desc, stop_event, position, connections)
+        except BrokenPipeError:
+            # ffmpeg stopped reading, its own error is reported below
+            stop_event.set()
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+            # Stop ffmpeg as well, otherwise it would finish with a truncated input
+            if getattr(ff, 'process', None):
+                ff.process.terminate()
+
+    writers = [
+        threading.Thread(target=in_context(feed), args=(selected_vdo, pipes[0], "Downloading Video", 0)),
+        threading.Thread(target=in_context(feed), args=(selected_ado, pipes[1], "Downloading Audio", 1))
+    ]
+    for writer in writers:
+        writer.start()
+
+    error = None
+    try:
+        # ffmpeg runs for the whole transfer here, so this span overlaps the transfer spans of both streams
+        with span('ffmpeg', output=os.path.basename(output_file), streaming=True):
+            ff.run(stdout=devnull, stderr=devnull)
+    except ffmpy.FFRuntimeError as e:
+        error = e
+    finally:
+        stop_event.set()
+        for writer in writers:
+            writer.join()
         devnull.close()
+        for pipe_path in pipes:
+            os.remove(pipe_path)
+        postprocess_cleanup(tempDIR, get_caption_suffixes(caption_code), random_filename)
 
-        shutil.move(output_temp_file, output_file)
-        postprocess_cleanup(tempDIR, ['_vdo.' + file_extention, '_ado.' + file_extention, '_merged.' + file_extention], random_filename)
-        print('Done! 🎉')
+    # A failed transfer also makes ffmpeg fail, so the transfer error is the one worth reporting
+    error = errors[0] if errors else error
+    if error:
+        if os.path.isfile(output_temp_file):
+            os.remove(output_temp_file)
+        raise error
 
-def convert_to_mp3(title, thumbnail_url, random_filename, mp3_artist='Unknown', mp3_title='Unknown', mp3_album='Unknown', tempDIR=tempDIR, downloadDIR=downloadDIR):
+    # ffmpeg can't seek in a pipe, so it may exit cleanly with a merged file missing a stream (or with an empty container)
+    # when a stream isn't fragmented, these are downloaded again and merged from temporary files instead
+    stream_types = get_stream_types(output_temp_file)
+    if 'Video' not in stream_types or 'Audio' not in stream_types or os.path.getsize(output_temp_file) < (selected_vdo.filesize + selected_ado.filesize) // 2:
+        os.remove(output_temp_file)
+        print('\nStreaming merge produced an incomplete file, merging from temporary files instead...')
+        return merge_audio_video(title, resolution, file_extention, download_nonprogressive(stream, itag_vdo, itag_ado, file_extention, tempDIR, connections, video_id), captions, caption_code, tempDIR, downloadDIR, video_id)
+
+    output_file = finalize_output_file(output_temp_file, output_file)
+    print('Done! 🎉')
+    return output_file
+
+def convert_to_mp3(title, thumbnail_url, random_filename, mp3_artist='Unknown', mp3_title='Unknown', mp3_album='Unknown', tempDIR=None, downloadDIR=None, video_id=None):
+    import ffmpy
+    tempDIR = tempDIR or get_temporary_directory()
+    downloadDIR = downloadDIR or load_config()['downloadDIR']
     image_file = os.path.join(tempDIR, random_filename + '_thumbnail.jpg')
-    download_thumbnail(thumbnail_url, image_file)
+    has_cover = download_thumbnail(thumbnail_url, image_file, video_id)
+    if not has_cover:
+        print('Continuing without cover art...')
     audio_file = os.path.join(tempDIR, random_filename + '_ado.mp4')
     output_file = os.path.join(downloadDIR, get_unique_filename(title + '_audio.mp3'))
 
     print('Processing...')
-    devnull = open(os.devnull, 'w')
-    video_file = os.path.join(tempDIR, random_filename + '_thumbnail.mp4')
-    ff1 = ffmpy.FFmpeg(
-        inputs={image_file: '-loop 1 -t 1'},
-        outputs={video_file: '-vf "scale=1280:720" -r 1 -c:v libx264 -t 1'}
-    )
-    ff1.run(stdout=devnull, stderr=devnull)
-
-    merged_file = os.path.join(tempDIR, random_filename + '_merged.mp4')
-    ff2 = ffmpy.FFmpeg(
-        inputs={video_file: None, audio_file: None},
-        outputs={merged_file: '-c:v copy -c:a copy'}
-    )
-    ff2.run(stdout=devnull, stderr=devnull)
-
     output_temp_file = os.path.join(tempDIR, random_filename + '_merged.mp3')
-    ff3 = ffmpy.FFmpeg(
-        inputs={merged_file: None},
-        outputs={output_temp_file: '-vn -c:a libmp3lame -q:a 2'}
+    devnull = open(os.devnull, 'w')
+    ff = ffmpy.FFmpeg(
+        global_options=['-y'],
+        inputs={audio_file: None, image_file: None} if has_cover else {audio_file: None},
+        outputs={output_temp_file: get_mp3_output_args(mp3_artist, mp3_title, mp3_album, has_cover)}
     )
-    ff3.run(stdout=devnull, stderr=devnull)
+    with span('ffmpeg', output=os.path.basename(output_file)):
+        ff.run(stdout=devnull, stderr=devnull)
     devnull.close()
 
-    audio = ID3(output_temp_file)
-    audio.add(TIT2(encoding=3, text=mp3_title))
-    audio.add(TPE1(encoding=3, text=mp3_artist))
-    audio.add(TALB(encoding=3, text=mp3_album))
-    with open(image_file, 'rb') as img:
-        audio.add(APIC(
-            encoding=3,
-            mime='image/jpeg',
-            type=3,
-            desc=u'Cover',
-            data=img.read()
-        ))
-    audio.save()
-
-    shutil.move(output_temp_file, output_file)
-    postprocess_cleanup(tempDIR, ['_thumbnail.jpg', '_thumbnail.mp4', '_ado.mp4', '_merged.mp4'], random_filename)
-    print('Done! 🎉')
\ No newline at end of file
+    output_file = finalize_output_file(output_temp_file, output_file)
+    postprocess_cleanup(tempDIR, ['_thumbnail.jpg', '_ado.mp4'], random_filename)
+    print('Done! 🎉')
+    return output_file
\ No newline at end of file
@@ -0,0 +1,75 @@
+import appdirs, os, re, json, time, threading
+
+class TokenBucket:
+    """Token bucket shared by every download thread of the process (tokens may go negative, the debt is paid by sleeping)"""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take amount tokens and return how many seconds the caller has to wait before using them"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - amount
+            self.updated = now
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def consume(self, amount):
+        wait = self.reserve(amount)
+        if wait:
+            time.sleep(wait)
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket kept in a locked state file, so every pytubepp process on the host shares the same bandwidth"""
+    def __init__(self, rate, state_file):
+        super().__init__(rate)
+        self.state_file = state_file
+
+    def reserve(self, amount):
+        import fcntl
+        with self.lock, open(self.state_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read())
+            except ValueError:
+                state = {'tokens': self.rate, 'updated': time.time()}
+            now = time.time()
+            tokens = min(self.rate, state['tokens'] + max(now - state['updated'], 0) * self.rate) - amount
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({'tokens': tokens, 'updated': now}))
+            f.flush()
+            fcntl.flock(f, fcntl.LOCK_UN)
+        return -tokens / self.rate if tokens < 0 else 0
+
+# Limiter used by every transfer of the process (None means unlimited)
+limiter = None
+
+def parse_rate(rate):
+    """Parse a rate like 500K, 20M or 1.5G (bytes per second, 1024 based) and return it in bytes per second (None if invalid)"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([KMG]?)B?', str(rate).strip(), re.IGNORECASE)
+    if not match:
+        return None
+    return int(float(match.group(1)) * 1024 ** ' KMG'.index(match.group(2).upper() or ' '))
+
+def set_rate_limit(rate, shared=False):
+    global limiter
+    if not rate:
+        limiter = None
+    elif shared and os.name == 'posix':
+        state_dir = appdirs.user_cache_dir('pytubepp')
+        os.makedirs(state_dir, exist_ok=True)
+        limiter = SharedTokenBucket(rate, os.path.join(state_dir, 'ratelimit.json'))
+    else:
+        limiter = TokenBucket(rate)
+
+def throttle(amount):
+    if limiter:
+        limiter.consume(amount)
+
+def reserve(amount):
+    # Non-blocking variant of throttle for the asyncio engine, which sleeps on the event loop instead
+    return limiter.reserve(amount) if limiter else 0
\ No newline at end of file
@@ -0,0 +1,253 @@
+from .download import cancel_event, DownloadCancelled
+from .utils import rprint, get_video_id, is_valid_url, get_partial_progress, remove_job
+import json, sys, time, threading, itertools
+
+LOOPBACK_HOSTS = ['127.0.0.1', 'localhost', '::1']
+
+class JobQueue:
+    """Runs download and info jobs of the daemon on a fixed number of workers, inside one warm process"""
+    def __init__(self, downloader, workers):
+        from concurrent.futures import ThreadPoolExecutor
+        self.downloader = downloader
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.video_locks = {}
+        self.job_ttl = downloader.user_config['serveJobTTL']
+        self.max_jobs = downloader.user_config['serveMaxJobs']
+
+    def prune(self):
+        """Forget finished jobs after job_ttl seconds, and the oldest finished ones while more than max_jobs are kept (call with the lock held)"""
+        now = time.time()
+        finished = sorted((job['finished'], job_id) for job_id, (job, _) in self.jobs.items() if job['finished'] is not None)
+        for finished_at, job_id in finished:
+            if now - finished_at > self.job_ttl or len(self.jobs) > self.max_jobs:
+                del self.jobs[job_id]
+        video_ids = set(get_video_id(job['url']) for job, _ in self.jobs.values())
+        for video_id in [video_id for video_id in self.video_locks if video_id not in video_ids]:
+            del self.video_locks[video_id]
+
+    def submit(self, kind, url, stream=None, caption=None):
+        """Queue a job and return it with True, or return the same download already queued or running with False"""
+        with self.lock:
+            for existing, _ in self.jobs.values():
+                if kind == existing['type'] == 'download' and existing['status'] in ['queued', 'running'] and (get_video_id(existing['url']), existing['stream'], existing['caption']) == (get_video_id(url), stream, caption):
+                    return existing, False
+        job = {'id': str(next(self.ids)), 'type': kind, 'url': url, 'stream': stream, 'caption': caption, 'status': 'queued', 'submitted': time.time(), 'started': None, 'finished': None, 'result': None, 'error': None}
+        event = threading.Event()
+        with self.lock:
+            self.jobs[job['id']] = (job, event)
+            self.prune()
+        self.executor.submit(self.run, job, event)
+        return job, True
+
+    def run(self, job, event):
+        if event.is_set():
+            return
+        if job['type'] == 'info':
+            self.run_job(job, event)
+            return
+        # Downloads of a video share its temporary files (<video id>_<itag>.part, <video id>.job.json), so they run one at a time
+        with self.lock:
+            video_lock = self.video_locks.setdefault(get_video_id(job['url']), threading.Lock())
+        with video_lock:
+            # Cancelled while waiting for the other download
+            if not event.is_set():
+                self.run_job(job, event)
+
+    def run_job(self, job, event):
+        from .main import YouTubeDownloader
+        job['status'], job['started'] = 'running', time.time()
+        cancel_event.set(event)
+        # Every job gets its own downloader, settings and environment checks are inherited from the daemon
+        job_downloader = YouTubeDownloader(self.downloader.user_config)
+        job_downloader.environment_checked = True
+        job_downloader.connections = self.downloader.connections
+        job_downloader.streaming_mux = self.downloader.streaming_mux
+        job_downloader.skip_existing = self.downloader.skip_existing
+        try:
+            if job['type'] == 'info':
+                job['result'] = job_downloader.get_video_details(job['url'])['info']
+            else:
+                job['stream'], job['caption'], job['result'] = job_downloader.batch_download(job['url'], job['stream'], job['caption'])
+            job['status'] = 'done'
+        except DownloadCancelled:
+            job['status'] = 'cancelled'
+            remove_job(get_video_id(job['url']))
+        except SystemExit:
+            job['status'], job['error'] = 'failed', 'Aborted'
+        except Exception as e:
+            job['status'], job['error'] = 'failed', str(e) or e.__class__.__name__
+        job['finished'] = time.time()
+
+    def cancel(self, job_id):
+        with self.lock:
+            if job_id not in self.jobs:
+                return None
+            job, event = self.jobs[job_id]
+        event.set()
+        if job['status'] == 'queued':
+            job['status'], job['finished'] = 'cancelled', time.time()
+        return job
+
+    def status(self, job_id):
+        with self.lock:
+            if job_id not in self.jobs:
+                return None
+            job, _ = self.jobs[job_id]
+        status = dict(job)
+        if job['type'] == 'download' and job['status'] == 'running':
+            downloaded, total = get_partial_progress(get_video_id(job['url']))
+            status['progress'] = {'downloaded': downloaded, 'total': total}
+        return status
+
+    def list(self):
+        with self.lock:
+            self.prune()
+            job_ids = list(self.jobs)
+        return [status for status in map(self.status, job_ids) if status]
+
+def make_handler(queue):
+    from http.server import BaseHTTPRequestHandler
+
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, code, data):
+            body = json.dumps(data).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def check_host(self):
+            # A daemon listening on loopback only answers to its own address, so web pages can't reach it through a
+            # DNS name of theirs resolving to 127.0.0.1 (DNS rebinding)
+            host, port = self.server.server_address[:2]
+            if host not in LOOPBACK_HOSTS or self.headers.get('Host') in [f'{name}:{port}' for name in ['127.0.0.1', 'localhost', '[::1]']]:
+                return True
+            self.send_json(403, {'error': 'Forbidden host'})
+            return False
+
+        def get_job_id(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) == 2 and parts[0] == 'jobs':
+                return parts[1]
+            return None
+
+        def do_GET(self):
+            if not self.check_host():
+                return
+            if self.path.rstrip('/') == '/jobs':
+                self.send_json(200, queue.list())
+                return
+            status = queue.status(self.get_job_id())
+            if status:
+                self.send_json(200, status)
+            else:
+                self.send_json(404, {'error': 'Job not found'})
+
+        def do_POST(self):
+            if not self.check_host():
+                return
+            if self.path.rstrip('/') != '/jobs':
+                self.send_json(404, {'error': 'Not found'})
+                return
+            # Web pages can only send JSON after a CORS preflight, which the daemon never allows
+            if self.headers.get_content_type() != 'application/json':
+                self.close_connection = True
+                self.send_json(415, {'error': 'Content-Type must be application/json'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                length = -1
+            if length < 0:
+                # Reading a body of unknown length would wait for the client to close the connection
+                self.close_connection = True
+                self.send_json(400, {'error': 'Invalid Content-Length'})
+                return
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                # json.JSONDecodeError and UnicodeDecodeError are both ValueErrors
+                request = None
+            if not isinstance(request, dict):
+                self.send_json(400, {'error': 'Invalid JSON body'})
+            elif request.get('type', 'download') not in ['download', 'info']:
+                self.send_json(400, {'error': 'Invalid job type (available types: download, info)'})
+            elif not isinstance(request.get('url'), str) or not is_valid_url(request['url']):
+                self.send_json(400, {'error': 'Invalid video link'})
+            else:
+                job, created = queue.submit(request.get('type', 'download'), request['url'], request.get('stream'), request.get('caption'))
+                self.send_json(201 if created else 200, job)
+
+        def do_DELETE(self):
+            if not self.check_host():
+                return
+            job = queue.cancel(self.get_job_id())
+            if job:
+                self.send_json(200, job)
+            else:
+                self.send_json(404, {'error': 'Job not found'})
+
+    return JobRequestHandler
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def serve(downloader, address, workers):
+    from http.server import ThreadingHTTPServer
+    host, port = parse_address(address)
+    # Environment checks and imports are paid once for the lifetime of the daemon
+    downloader.check_environment()
+    queue = JobQueue(downloader, workers)
+    server = ThreadingHTTPServer((host, port), make_handler(queue))
+    if host not in LOOPBACK_HOSTS:
+        rprint(f'[dark_orange]WARNING:[/dark_orange] The job API has no authentication and is reachable from other hosts on {host}!')
+    rprint(f'PytubePP daemon listening on [steel_blue3]http://{host}:{port}[/steel_blue3] (workers: {workers}) press CTRL + C to stop...')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\nStopping daemon...')
+    finally:
+        server.server_close()
+        for job, event in list(queue.jobs.values()):
+            event.set()
+        queue.executor.shutdown(wait=True)
+
+def request_daemon(address, method, path, data=None, timeout=10):
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+    host, port = parse_address(address)
+    request = Request(f'http://{host}:{port}{path}', data=json.dumps(data).encode() if data is not None else None, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except HTTPError as e:
+        return json.loads(e.read())
+
+def submit_to_daemon(address, url, stream=None, caption=None, wait=False):
+    """Thin client: hand a download job over to a running daemon instead of downloading in this process"""
+    try:
+        job = request_daemon(address, 'POST', '/jobs', {'type': 'download', 'url': url, 'stream': stream, 'caption': caption})
+    except OSError as e:
+        print(f'\nUnable to reach the pytubepp daemon at {address}! Please start it with: pytubepp --serve ({e})')
+        sys.exit(1)
+    if 'id' not in job:
+        print(f'\n{job["error"]}! Please check the video url...!!')
+        sys.exit(1)
+    print(f'Job {job["id"]} submitted! (status: http://{address}/jobs/{job["id"]})')
+    if wait:
+        while job['status'] in ['queued', 'running']:
+            time.sleep(1)
+            job = request_daemon(address, 'GET', f'/jobs/{job["id"]}')
+            if 'progress' in job and job['progress']['total']:
+                print(f'\rDownloading... {job["progress"]["downloaded"] * 100 / job["progress"]["total"]:.1f}%', end='', flush=True)
+        print(f'\nJob {job["id"]} {job["status"]}: {job["result"] or job["error"] or ""}')
+        if job['status'] != 'done':
+            sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,30 @@
+from .config import load_config
+import threading
+
+# One pooled requests session per process, so every thumbnail, segment and update check request
+# reuses the open keep-alive connections to the same hosts instead of a new TCP+TLS handshake each time
+session = None
+session_lock = threading.Lock()
+
+def get_session():
+    global session
+    with session_lock:
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            config = load_config()
+            # Connection failures and transient server errors are retried here, with exponential backoff
+            retry = Retry(total=config['httpRetries'], backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET', 'HEAD'], raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=config['httpPoolSize'], max_retries=retry)
+            new_session = requests.Session()
+            new_session.mount('https://', adapter)
+            new_session.mount('http://', adapter)
+            session = new_session
+    return session
+
+def get_timeout():
+    return load_config()['httpTimeout']
+
+def http_get(url, stream=False, timeout=None):
+    return get_session().get(url, stream=stream, timeout=timeout or get_timeout())
\ No newline at end of file
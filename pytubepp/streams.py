@@ -0,0 +1,62 @@
+# Ranked download candidates of every resolution as (video itag, audio itag, container), best first:
+# HDR variants come first, then high frame rate ones, then the standard streams.
+# Progressive streams carry their own audio (audio itag None) and mp3 has no video (video itag None)
+STREAM_TABLE = {
+    '4320p': {'label': '8k', 'candidates': [(702, 140, 'mp4'), (571, 140, 'mp4')]},
+    '2160p': {'label': '4k', 'candidates': [(701, 140, 'mp4'), (315, 251, 'webm'), (313, 251, 'webm')]},
+    '1440p': {'label': '2k', 'candidates': [(700, 140, 'mp4'), (308, 251, 'webm'), (271, 251, 'webm')]},
+    '1080p': {'label': '1080p', 'candidates': [(699, 140, 'mp4'), (299, 140, 'mp4'), (137, 140, 'mp4')]},
+    '720p': {'label': '720p', 'candidates': [(698, 140, 'mp4'), (298, 140, 'mp4'), (136, 140, 'mp4')]},
+    '480p': {'label': '480p', 'candidates': [(135, 140, 'mp4')]},
+    '360p': {'label': '360p', 'candidates': [(18, None, 'mp4')]},
+    '240p': {'label': '240p', 'candidates': [(133, 140, 'mp4')]},
+    '144p': {'label': '144p', 'candidates': [(160, 140, 'mp4')]},
+    'mp3': {'label': 'mp3', 'candidates': [(None, 140, 'mp3')]},
+}
+
+HDR_ITAGS = [698, 699, 700, 701, 702]
+
+def select_audio_itag(video_stream):
+    return 251 if video_stream.mime_type == 'video/webm' else 140
+
+def make_candidate(res, video_stream, audio_stream, file_extention):
+    return {
+        'res': res,
+        'label': STREAM_TABLE[res]['label'],
+        'video': video_stream,
+        'audio': audio_stream,
+        'ext': file_extention,
+        'progressive': video_stream is not None and video_stream is audio_stream,
+        'hdr': video_stream is not None and video_stream.itag in HDR_ITAGS
+    }
+
+def build_stream_index(stream):
+    """Map every available resolution to its ranked download candidates (scans the stream list only once)"""
+    streams_by_itag = {}
+    streams_by_res = {}
+    for s in stream:
+        streams_by_itag[s.itag] = s
+        if s.resolution:
+            streams_by_res.setdefault(s.resolution, []).append(s)
+
+    index = {}
+    for res, entry in STREAM_TABLE.items():
+        candidates = []
+        for itag_vdo, itag_ado, file_extention in entry['candidates']:
+            video_stream = streams_by_itag.get(itag_vdo) if itag_vdo else None
+            audio_stream = streams_by_itag.get(itag_ado) if itag_ado else video_stream
+            if (itag_vdo and not video_stream) or not audio_stream:
+                continue
+            candidates.append(make_candidate(res, video_stream, audio_stream, file_extention))
+
+        # Adaptive streams missing from the table are still usable, preferring mp4, then higher frame rate and bitrate
+        known_itags = [itag_vdo for itag_vdo, _, _ in entry['candidates']]
+        unknown_streams = [s for s in streams_by_res.get(res, []) if s.itag not in known_itags and getattr(s, 'is_adaptive', False) and getattr(s, 'includes_video_track', False)]
+        for video_stream in sorted(unknown_streams, key=lambda s: (s.mime_type == 'video/webm', -(s.fps or 0), -(s.bitrate or 0))):
+            audio_stream = streams_by_itag.get(select_audio_itag(video_stream))
+            if audio_stream:
+                candidates.append(make_candidate(res, video_stream, audio_stream, 'webm' if video_stream.mime_type == 'video/webm' else 'mp4'))
+
+        if candidates:
+            index[res] = candidates
+    return index
\ No newline at end of file
@@ -0,0 +1,74 @@
+from .config import load_config
+from .cache import read_cache, write_cache
+from .utils import unpack_caption
+from .ratelimit import throttle
+from .metrics import span
+import os, re
+
+SRT_TIMESTAMP = re.compile(r'(\d+:\d{2}:\d{2}),(\d{3})')
+
+def split_cues(text):
+    return [block.strip('\n') for block in re.split(r'\n\s*\n', text.replace('\r\n', '\n').replace('\r', '\n').lstrip('\ufeff')) if block.strip()]
+
+def srt_to_vtt(srt_text):
+    """Convert SubRip captions to WebVTT (cue numbers are kept as cue identifiers)"""
+    cues = []
+    for block in split_cues(srt_text):
+        lines = block.split('\n')
+        cues.append('\n'.join(SRT_TIMESTAMP.sub(r'\1.\2', line) if '-->' in line else line for line in lines))
+    return 'WEBVTT\n\n' + '\n\n'.join(cues) + '\n'
+
+def get_caption_srt(caption, caption_code, video_id=None):
+    # Caption tracks are cached per video and caption code, so repeat downloads of a video don't fetch them again
+    cache_key = f'{video_id}_{caption_code}' if video_id else None
+    config = load_config()
+    srt_text = read_cache('caption', cache_key, config['infoCacheTTL']) if cache_key else None
+    if srt_text is None:
+        print(f'Downloading Caption ({caption_code})...')
+        with span('caption', video_id=video_id, code=caption_code):
+            srt_text = caption.generate_srt_captions()
+        throttle(len(srt_text.encode('utf-8')))
+        if cache_key:
+            write_cache('caption', cache_key, srt_text, max_entries=config['captionCacheSize'])
+    return srt_text
+
+def split_captions(caption_code):
+    """Split a caption selection like en,es,a.fr (or a list of codes from the config) into its caption codes"""
+    if not caption_code:
+        return []
+    codes = caption_code if isinstance(caption_code, list) else str(caption_code).split(',')
+    return [code.strip() for code in codes if code.strip()]
+
+def join_captions(caption_code):
+    return ','.join(split_captions(caption_code)) or None
+
+def get_caption_suffixes(caption_code):
+    # Temporary subtitle files of every chosen caption (for postprocess_cleanup)
+    return [f'_cap{index}.{ext}' for index in range(len(split_captions(caption_code))) for ext in ['srt', 'vtt']]
+
+def prepare_caption(captions, caption_code, tempDIR, random_filename, file_extention, video_id=None, media_inputs=2):
+    """Write the chosen captions (eg: en,es,a.fr) in a format the output container supports and return the matching ffmpeg output args"""
+    from concurrent.futures import ThreadPoolExecutor
+    caption_codes = split_captions(caption_code)
+    # Every caption track is fetched at once
+    with ThreadPoolExecutor(max_workers=max(len(caption_codes), 1)) as executor:
+        srt_texts = list(executor.map(lambda code: get_caption_srt(captions[code], code, video_id), caption_codes))
+
+    if file_extention == 'webm':
+        subtitle_ext, subtitle_codec = 'vtt', 'webvtt'
+    else:
+        subtitle_ext, subtitle_codec = 'srt', 'mov_text'
+
+    # Media inputs and caption tracks are mapped explicitly, as ffmpeg would otherwise pick a single subtitle stream
+    input_args = []
+    output_args = [arg for index in range(media_inputs) for arg in ['-map', str(index)]]
+    for index, (code, srt_text) in enumerate(zip(caption_codes, srt_texts)):
+        _, caption_lang = unpack_caption(captions[code])
+        subtitle_file = os.path.join(tempDIR, f'{random_filename}_cap{index}.{subtitle_ext}')
+        with open(subtitle_file, 'w', encoding='utf-8') as f:
+            f.write(srt_to_vtt(srt_text) if subtitle_ext == 'vtt' else srt_text)
+        input_args += ['-i', subtitle_file]
+        output_args += ['-map', str(media_inputs + index), f'-metadata:s:s:{index}', f'language={code}',
+                        f'-metadata:s:s:{index}', f'title={caption_lang}', f'-metadata:s:s:{index}', f'handler_name={caption_lang}']
+
+    return input_args + output_args + ['-c:v', 'copy', '-c:a', 'copy', '-c:s', subtitle_codec]
\ No newline at end of file
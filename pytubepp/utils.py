@@ -1,33 +1,55 @@
 from importlib.metadata import version
 from .config import load_config, get_temporary_directory
-import os, re, subprocess, platform, requests
+from .cache import read_cache, write_cache
+from .metrics import span
+import os, re, subprocess, platform, json, time, shutil, socket, threading, errno
 
-userConfig = load_config()
-downloadDIR = userConfig['downloadDIR']
-tempDIR = get_temporary_directory()
+def rprint(*args, **kwargs):
+    # rich is only imported when something actually gets printed with it
+    from rich import print as rich_print
+    rich_print(*args, **kwargs)
 
-def network_available():
+def network_available(host='www.youtube.com', port=443, timeout=3):
+    # A plain TCP handshake is much cheaper than ping and also works where ICMP is blocked
     try:
-        param = '-n' if platform.system().lower() == 'windows' else '-c'
-        command = ['ping', param, '1', 'youtube.com']
-        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        return True
-    except subprocess.CalledProcessError:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
         return False
-    
-def nodejs_installed():
+
+def binary_installed(name, version_flag):
+    binary_path = shutil.which(name)
+    if not binary_path:
+        return False
+    binary_path = os.path.realpath(binary_path)
     try:
-        subprocess.run(['node', '--version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        mtime = os.path.getmtime(binary_path)
+    except OSError:
         return False
+
+    # Probe results stay valid as long as the resolved binary is not replaced
+    probe = read_cache('probe', name)
+    if probe and probe['path'] == binary_path and probe['mtime'] == mtime:
+        return probe['installed']
+
+    try:
+        subprocess.run([binary_path, version_flag], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        installed = True
+    except (subprocess.CalledProcessError, OSError):
+        installed = False
+    write_cache('probe', name, {'path': binary_path, 'mtime': mtime, 'installed': installed})
+    return installed
+
+def nodejs_installed():
+    return binary_installed('node', '--version')
     
 def ffmpeg_installed():
-    try:
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+    return binary_installed('ffmpeg', '-version')
+
+def async_engine_available():
+    # The async engine's dependencies are an optional extra: pip install "pytubepp[async]"
+    from importlib.util import find_spec
+    return all(find_spec(name) for name in ['aiohttp', 'yarl'])
 
 def get_version():
     try:
@@ -36,10 +58,22 @@ def get_version():
         return "Unknown"
     
 def is_valid_url(url):
-    match = re.search(r"(https?://(?:www\.|music\.)?youtube\.com/(?:watch\?v=[^&]{11}|shorts/[^?&]+)|https?://youtu\.be/[^?&]*(\?si=[^&]*)?)", url)
+    # Video ids name cache and staging files (eg: <video id>.job.json), so they are exactly 11 url-safe characters
+    match = re.search(r"(https?://(?:www\.|music\.)?youtube\.com/(?:watch\?v=(?P<watch_id>[A-Za-z0-9_-]{11})|shorts/(?P<shorts_id>[A-Za-z0-9_-]{11}))|https?://youtu\.be/(?P<short_link_id>[A-Za-z0-9_-]{11})(\?si=[^&]*)?)(?![A-Za-z0-9_-])", url)
     return match
-    
-def get_unique_filename(filename, directory=downloadDIR):
+
+def is_collection_url(url):
+    match = re.search(r"https?://(?:www\.|music\.)?youtube\.com/(?:playlist\?list=[\w-]+|@[\w.-]+|channel/[\w-]+|c/[\w.-]+|user/[\w.-]+)", url)
+    return match
+
+def get_video_id(url):
+    match = is_valid_url(url)
+    if not match:
+        return None
+    return match.group('watch_id') or match.group('shorts_id') or match.group('short_link_id')
+
+def get_unique_filename(filename, directory=None):
+    directory = directory or load_config()['downloadDIR']
     base_name, extension = os.path.splitext(filename)
     counter = 1
     while os.path.exists(os.path.join(directory, filename)):
@@ -47,6 +81,9 @@ def get_unique_filename(filename, directory=downloadDIR):
         counter += 1
     return filename
 
+def format_filesize(filesize):
+    return f"{filesize / (1024 * 1024 * 1024):.2f} GB" if filesize >= 1073741824 else f"{filesize / (1024 * 1024):.2f} MB"
+
 def unpack_caption(caption):
     caption_str = str(caption)
     code_start = caption_str.find('code="') + 6
@@ -58,6 +95,70 @@ def unpack_caption(caption):
     lang = caption_str[lang_start:lang_end]
     return code, lang
 
+def copy_file_data(src_fd, dst_fd, size):
+    # Copy inside the kernel when possible (copy_file_range, then sendfile) and only fall back to a userspace copy when both fail
+    offset = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+                if not copied:
+                    break
+                offset += copied
+        except OSError:
+            pass
+    if offset < size and hasattr(os, 'sendfile'):
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        try:
+            while offset < size:
+                sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if not sent:
+                    break
+                offset += sent
+        except OSError:
+            pass
+    if offset < size:
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        while True:
+            chunk = os.read(src_fd, 1048576)
+            if not chunk:
+                break
+            os.write(dst_fd, chunk)
+
+def finalize_file(src, dst):
+    """Move a finished file to its destination, atomically with a rename when both are on the same filesystem"""
+    with span('finalize', file=os.path.basename(dst)) as finalize_span:
+        try:
+            os.replace(src, dst)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        finalize_span.set(copied=True)
+        # Cross-device: copy into a hidden file next to the destination first, so the destination never holds a partial file
+        dst_temp = os.path.join(os.path.dirname(dst), '.' + os.path.basename(dst) + '.part')
+        try:
+            with open(src, 'rb') as fsrc, open(dst_temp, 'wb') as fdst:
+                copy_file_data(fsrc.fileno(), fdst.fileno(), os.fstat(fsrc.fileno()).st_size)
+            os.replace(dst_temp, dst)
+        except BaseException:
+            if os.path.isfile(dst_temp):
+                os.remove(dst_temp)
+            raise
+        os.remove(src)
+
+output_lock = threading.Lock()
+
+def finalize_output_file(src, dst):
+    """Finalize a job's output to dst, or to the next free numbered name when dst got taken in the meantime (returns the final path)"""
+    # Concurrent jobs pick their names before downloading, so the name is checked again and claimed together with the move
+    directory = os.path.dirname(dst)
+    with output_lock:
+        dst = os.path.join(directory, get_unique_filename(os.path.basename(dst), directory))
+        finalize_file(src, dst)
+    return dst
+
 def postprocess_cleanup(dir, files, random_filename):
     for file in files:
         file_path = os.path.join(dir, random_filename + file)
@@ -67,9 +168,14 @@ def postprocess_cleanup(dir, files, random_filename):
         except Exception as e:
             print(e)
 
+def list_temp_files(tempDIR):
+    # The staging folder is only created once something is downloaded
+    return os.listdir(tempDIR) if os.path.isdir(tempDIR) else []
+
 def clear_temp_files():
-    if os.listdir(tempDIR) != []:
-        for file in os.listdir(tempDIR):
+    tempDIR = get_temporary_directory(create=False)
+    if list_temp_files(tempDIR) != []:
+        for file in list_temp_files(tempDIR):
             file_path = os.path.join(tempDIR, file)
             try:
                 if os.path.isfile(file_path):
@@ -80,6 +186,77 @@ def clear_temp_files():
     else:
         print('No temporary files found to clear...!')
 
+def save_job(video_id, link, chosen_stream, chosen_caption=None):
+    tempDIR = get_temporary_directory()
+    job_file = os.path.join(tempDIR, video_id + '.job.json')
+    with open(job_file, 'w') as f:
+        json.dump({'url': link, 'stream': chosen_stream, 'caption': chosen_caption, 'created': time.time()}, f)
+
+def remove_job(video_id):
+    tempDIR = get_temporary_directory(create=False)
+    job_file = os.path.join(tempDIR, video_id + '.job.json')
+    if os.path.isfile(job_file):
+        os.remove(job_file)
+
+def load_jobs():
+    tempDIR = get_temporary_directory(create=False)
+    jobs = {}
+    for file in list_temp_files(tempDIR):
+        if file.endswith('.job.json'):
+            try:
+                with open(os.path.join(tempDIR, file), 'r') as f:
+                    jobs[file[:-len('.job.json')]] = json.load(f)
+            except (OSError, ValueError):
+                pass
+    return jobs
+
+def get_partial_progress(video_id):
+    tempDIR = get_temporary_directory(create=False)
+    downloaded, total = 0, 0
+    for file in list_temp_files(tempDIR):
+        if file.startswith(video_id + '_') and file.endswith('.part.json'):
+            try:
+                with open(os.path.join(tempDIR, file), 'r') as f:
+                    journal = json.load(f)
+            except (OSError, ValueError):
+                continue
+            downloaded += sum(end - start + 1 for start, end in journal.get('completed', []))
+            total += journal.get('filesize', 0)
+        elif file.startswith(video_id + '_') and file.endswith(('_vdo.mp4', '_vdo.webm', '_ado.mp4', '_ado.webm')):
+            # Streams that finished downloading before the job was interrupted
+            size = os.path.getsize(os.path.join(tempDIR, file))
+            downloaded += size
+            total += size
+    return downloaded, total
+
+def list_partial_downloads():
+    from tabulate import tabulate
+    jobs = load_jobs()
+    if not jobs:
+        print('No partial downloads found...!')
+        return
+    table = []
+    for video_id, job in jobs.items():
+        downloaded, total = get_partial_progress(video_id)
+        table.append([job['url'], job['stream'], job['caption'] or 'none', f'{downloaded * 100 / total:.1f}%' if total else '0.0%', f"{(time.time() - job['created']) / 3600:.1f} hours ago"])
+    print('\n')
+    print(tabulate(table, headers=['Video', 'Stream', 'Caption', 'Downloaded', 'Started']))
+    print('\n')
+
+def expire_partial_downloads(max_age_days):
+    tempDIR = get_temporary_directory(create=False)
+    expired = False
+    expired_before = time.time() - max_age_days * 86400
+    for video_id, job in load_jobs().items():
+        if job['created'] < expired_before:
+            for file in os.listdir(tempDIR):
+                if file.startswith(video_id + '_') or file == video_id + '.job.json':
+                    os.remove(os.path.join(tempDIR, file))
+                    print(f'Removed: {file}')
+                    expired = True
+    if not expired:
+        print(f'No partial downloads older than {max_age_days} days found to expire...!')
+
 def compare_versions(v1: str, v2: str):
     parts1 = list(map(int, v1.split('.')))
     parts2 = list(map(int, v2.split('.')))
@@ -98,12 +275,31 @@ def get_platform_specific_upgrade_command():
     else:
         return 'pip3 install pytubefix pytubepp --upgrade && pytubepp --postinstall'
 
+def fetch_latest_version():
+    from .session import http_get
+    try:
+        response = http_get('https://pypi.org/pypi/pytubepp/json', timeout=5)
+        if response.status_code == 200:
+            write_cache('update', 'pypi', response.json()['info']['version'])
+    except Exception:
+        pass
+
 def check_update():
+    userConfig = load_config()
+    if os.environ.get('PYTUBEPP_NO_UPDATE_CHECK') or not userConfig['updateCheck']:
+        return False, None, None, None
     try:
-        response = requests.get('https://pypi.org/pypi/pytubepp/json')
-        if response.status_code != 200:
+        latest_version = read_cache('update', 'pypi', userConfig['updateCheckInterval'])
+        if latest_version is None:
+            # Refresh in the background and use the last known version (if any) for now, so the check never delays a download.
+            # The attempt is recorded first, so failed lookups (offline) or lookups cut short by the process exiting are
+            # only retried after updateCheckInterval as well
+            if read_cache('update', 'attempt', userConfig['updateCheckInterval']) is None:
+                write_cache('update', 'attempt', True)
+                threading.Thread(target=fetch_latest_version, daemon=True).start()
+            latest_version = read_cache('update', 'pypi')
+        if not latest_version:
             return False, None, None, None
-        latest_version = response.json()['info']['version']
         current_version = get_version()
         return compare_versions(current_version, latest_version) == -1, current_version, latest_version, get_platform_specific_upgrade_command()
     except Exception as e:
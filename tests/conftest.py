@@ -0,0 +1,115 @@
+import json, os, shutil, subprocess, threading
+import pytest
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+requires_ffmpeg = pytest.mark.skipif(not shutil.which('ffmpeg'), reason='ffmpeg not found in PATH')
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """Fresh config, cache, staging and download folders for every test"""
+    import pytubepp.config, pytubepp.session
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path / 'config'))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    for name in ['config/pytubepp', 'downloads', 'staging']:
+        (tmp_path / name).mkdir(parents=True)
+    settings = {'downloadDIR': str(tmp_path / 'downloads'), 'stagingDIR': str(tmp_path / 'staging'), 'networkCheck': False, 'updateCheck': False}
+    (tmp_path / 'config' / 'pytubepp' / 'config.json').write_text(json.dumps(settings))
+    monkeypatch.setattr(pytubepp.config, 'user_config', None)
+    monkeypatch.setattr(pytubepp.session, 'session', None)
+    return pytubepp.config.load_config()
+
+class StreamServer:
+    """Local stand-in for googlevideo: serves the files of a folder, honouring the range query parameter"""
+    def __init__(self, root):
+        self.root = root
+        self.requests = []
+        # Number of upcoming range requests to cut off halfway through the body
+        self.drop_connections = 0
+        self.lock = threading.Lock()
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                with server.lock:
+                    server.requests.append((url.path, query.get('range', [None])[0]))
+                    drop = 'range' in query and server.drop_connections > 0
+                    if drop:
+                        server.drop_connections -= 1
+                file_path = os.path.join(server.root, os.path.basename(url.path))
+                if not os.path.isfile(file_path):
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+                if 'range' in query:
+                    start, end = map(int, query['range'][0].split('-'))
+                    data = data[start:end + 1]
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                if drop:
+                    self.wfile.write(data[:len(data) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(data)
+
+        return Handler
+
+@pytest.fixture
+def stream_server(tmp_path):
+    root = tmp_path / 'server'
+    root.mkdir()
+    server = StreamServer(str(root))
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), server.handler())
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    server.url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    yield server
+    httpd.shutdown()
+    httpd.server_close()
+
+# Fragmented files are laid out like YouTube's DASH streams
+DASH = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+
+def make_audio(file_path, duration=1, fragmented=False):
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}', '-c:a', 'aac'] + (DASH if fragmented else []) + [file_path], check=True)
+
+def make_video(file_path, duration=1, fragmented=False):
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', f'testsrc2=size=320x240:rate=10:duration={duration}', '-c:v', 'libx264', '-preset', 'ultrafast', '-an'] + (DASH if fragmented else []) + [file_path], check=True)
+
+class FakeStream:
+    def __init__(self, base_url, file_path, itag, resolution=None, mime_type='video/mp4', abr=None, is_adaptive=True):
+        self.url = f'{base_url}/{os.path.basename(file_path)}?itag={itag}'
+        self.filesize = os.path.getsize(file_path)
+        self.itag, self.resolution, self.mime_type, self.abr = itag, resolution, mime_type, abr
+        self.is_adaptive, self.includes_video_track = is_adaptive, resolution is not None
+        self.is_sabr, self.fps, self.bitrate = False, 30, 1000
+
+class FakeStreamQuery(list):
+    def get_by_itag(self, itag):
+        return next((stream for stream in self if stream.itag == itag), None)
+
+def fake_youtube(base_url, streams, title='Same Title', author='Author'):
+    """pytubefix.YouTube stand-in, every video gets the same title unless given otherwise"""
+    class FakeYouTube:
+        def __init__(self, url, on_progress_callback=None, **kwargs):
+            self.video_id = url.split('v=')[-1][:11]
+            self.title, self.author, self.views = title, author, 1
+            self.thumbnail_url = f'{base_url}/vi/{self.video_id}/hqdefault.jpg'
+            self.captions = {}
+            self.publish_date, self.length = None, 1
+            self.streams = FakeStreamQuery(FakeStream(base_url, **stream) for stream in streams)
+    return FakeYouTube
\ No newline at end of file
@@ -0,0 +1,63 @@
+import asyncio, importlib, os
+import pytest
+
+from conftest import requires_ffmpeg, make_audio, make_video, fake_youtube
+
+pytest.importorskip('aiohttp')
+
+URLS = [f'https://www.youtube.com/watch?v=video{index:06d}' for index in range(4)]
+
+def download_all(monkeypatch, stream_server, streams, chosen_stream):
+    from pytubepp.main import YouTubeDownloader
+    from pytubepp.aio import download_videos_async
+    monkeypatch.setattr('pytubefix.YouTube', fake_youtube(stream_server.url, streams))
+    downloader = YouTubeDownloader()
+    downloader.environment_checked = True
+    return asyncio.run(download_videos_async(downloader, URLS, len(URLS), chosen_stream))
+
+@requires_ffmpeg
+def test_concurrent_mp3_jobs_get_distinct_output_files(config, stream_server, monkeypatch):
+    audio_file = os.path.join(stream_server.root, 'audio.mp4')
+    make_audio(audio_file)
+    results = download_all(monkeypatch, stream_server, [{'file_path': audio_file, 'itag': 140, 'mime_type': 'audio/mp4', 'abr': '128kbps'}], 'mp3')
+
+    assert [result[3] for result in results] == ['Done'] * len(URLS)
+    output_files = [result[4] for result in results]
+    assert len(set(output_files)) == len(URLS)
+    assert sorted(os.listdir(config['downloadDIR'])) == sorted(os.path.basename(output_file) for output_file in output_files)
+    assert all(os.path.getsize(output_file) > 0 for output_file in output_files)
+
+@requires_ffmpeg
+def test_concurrent_merge_jobs_get_distinct_output_files(config, stream_server, monkeypatch):
+    video_file, audio_file = os.path.join(stream_server.root, 'video.mp4'), os.path.join(stream_server.root, 'audio.mp4')
+    make_video(video_file)
+    make_audio(audio_file)
+    results = download_all(monkeypatch, stream_server, [
+        {'file_path': video_file, 'itag': 136, 'resolution': '720p'},
+        {'file_path': audio_file, 'itag': 140, 'mime_type': 'audio/mp4', 'abr': '128kbps'}
+    ], '720p')
+
+    assert [result[3] for result in results] == ['Done'] * len(URLS)
+    assert len(set(result[4] for result in results)) == len(URLS)
+    assert len(os.listdir(config['downloadDIR'])) == len(URLS)
+
+def test_missing_async_dependencies_are_reported(config, monkeypatch, capsys):
+    from pytubepp.main import YouTubeDownloader, download_videos
+    # pytubepp.main is shadowed by the main() function re-exported from the package
+    cli = importlib.import_module('pytubepp.main')
+    monkeypatch.setattr(cli, 'async_engine_available', lambda: False)
+    monkeypatch.setattr(cli, 'ffmpeg_installed', lambda: True)
+    downloader = YouTubeDownloader()
+    downloader.async_engine = True
+    with pytest.raises(SystemExit):
+        download_videos(downloader, URLS, 2, 'mp3')
+    assert 'pip install "pytubepp[async]"' in capsys.readouterr().out
+
+def test_invalid_url_is_reported(config, stream_server, monkeypatch):
+    from pytubepp.main import YouTubeDownloader
+    from pytubepp.aio import download_videos_async
+    monkeypatch.setattr('pytubefix.YouTube', fake_youtube(stream_server.url, []))
+    downloader = YouTubeDownloader()
+    downloader.environment_checked = True
+    results = asyncio.run(download_videos_async(downloader, ['not a url'], 1, 'mp3'))
+    assert results == [['not a url', 'mp3', '-', 'Failed', 'Invalid video link']]
\ No newline at end of file
@@ -0,0 +1,48 @@
+import importlib, os, sys
+import pytest
+
+URL = 'https://www.youtube.com/watch?v=video000000'
+
+def record(config, name, stream, caption=None):
+    from pytubepp.archive import record_download
+    output_file = os.path.join(config['downloadDIR'], name)
+    with open(output_file, 'wb') as f:
+        f.write(b'downloaded')
+    record_download('video000000', stream, 136 if stream != 'mp3' else None, 140, caption, output_file)
+    return output_file
+
+def test_archived_download_matches_the_stream(config):
+    from pytubepp.main import YouTubeDownloader
+    downloader = YouTubeDownloader()
+    output_file = record(config, 'Title_audio.mp3', 'mp3')
+    assert downloader.find_archived_download(URL, '720p') is None
+    assert downloader.find_archived_download(URL, 'max') is None
+    assert downloader.find_archived_download(URL, 'mp3')['output_path'] == output_file
+
+def test_archived_download_matches_the_caption(config):
+    from pytubepp.main import YouTubeDownloader
+    downloader = YouTubeDownloader()
+    output_file = record(config, 'Title_720p_en_fr.mp4', '720p', 'en,fr')
+    # Any caption unless one was asked for
+    assert downloader.find_archived_download(URL, 'hd')['output_path'] == output_file
+    assert downloader.find_archived_download(URL, '720', 'fr,en')['output_path'] == output_file
+    assert downloader.find_archived_download(URL, '720p', 'en') is None
+    assert downloader.find_archived_download(URL, '720p', 'none') is None
+    assert downloader.find_archived_download(URL, '1080p') is None
+    # The default stream (max) is any video stream
+    assert downloader.find_archived_download(URL)['output_path'] == output_file
+
+@pytest.mark.parametrize('stream, skipped', [('720p', False), ('mp3', True)])
+def test_other_stream_is_downloaded_again(config, monkeypatch, capsys, stream, skipped):
+    from pytubepp.main import YouTubeDownloader
+    cli = importlib.import_module('pytubepp.main')
+    record(config, 'Title_audio.mp3', 'mp3')
+    downloads = []
+    monkeypatch.setattr(YouTubeDownloader, 'set_video_info', lambda self, link: downloads.append(link) and False)
+    monkeypatch.setattr(sys, 'argv', ['pytubepp', URL, '-s', stream, '-se'])
+    try:
+        cli.main()
+    except SystemExit:
+        pass
+    assert ('Video already downloaded!' in capsys.readouterr().out) == skipped
+    assert downloads == ([] if skipped else [URL])
\ No newline at end of file
@@ -0,0 +1,32 @@
+import importlib, json, os, sys
+import pytest
+
+def get_config_file(tmp_path):
+    return tmp_path / 'config' / 'pytubepp' / 'config.json'
+
+def test_update_config_only_writes_the_user_settings(config, tmp_path):
+    from pytubepp.config import update_config, load_config
+    settings = json.loads(get_config_file(tmp_path).read_text())
+    update_config('defaultStream', '720p')
+    assert json.loads(get_config_file(tmp_path).read_text()) == dict(settings, defaultStream='720p')
+    assert load_config()['defaultStream'] == '720p'
+
+@pytest.mark.parametrize('argv', [['-v'], ['-sc'], ['-ct', 'list']])
+def test_staging_folder_is_only_created_for_downloads(config, tmp_path, monkeypatch, capsys, argv):
+    import pytubepp.config
+    from pytubepp.main import YouTubeDownloader
+    # Default staging folder, inside the download folder
+    settings = json.loads(get_config_file(tmp_path).read_text())
+    del settings['stagingDIR']
+    get_config_file(tmp_path).write_text(json.dumps(settings))
+    monkeypatch.setattr(pytubepp.config, 'user_config', None)
+    staging_dir = os.path.join(settings['downloadDIR'], '.pytubepp-staging')
+
+    cli = importlib.import_module('pytubepp.main')
+    monkeypatch.setattr(sys, 'argv', ['pytubepp'] + argv)
+    try:
+        cli.main()
+    except SystemExit:
+        pass
+    assert not os.path.exists(staging_dir)
+    assert YouTubeDownloader().temp_dir == staging_dir and os.path.isdir(staging_dir)
\ No newline at end of file
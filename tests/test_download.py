@@ -0,0 +1,92 @@
+import os, signal, threading, time
+import pytest
+
+from conftest import FakeStream, FakeStreamQuery
+
+SEGMENT_SIZE = 65536
+
+def write_file(stream_server, name, size):
+    data = os.urandom(size)
+    with open(os.path.join(stream_server.root, name), 'wb') as f:
+        f.write(data)
+    return data
+
+def download(stream_server, name, connections, **kwargs):
+    from pytubepp.download import download_segmented
+    file_path = os.path.join(stream_server.root, name)
+    output_file = file_path + '.out'
+    download_segmented(f'{stream_server.url}/{name}?itag=136', os.path.getsize(file_path), output_file, 'Downloading Video', connections=connections, segment_size=SEGMENT_SIZE, **kwargs)
+    with open(output_file, 'rb') as f:
+        return f.read()
+
+def test_missing_segments():
+    from pytubepp.download import get_missing_segments
+    assert get_missing_segments([], 10, 4) == [(0, 3), (4, 7), (8, 9)]
+    assert get_missing_segments([], 8, 4) == [(0, 3), (4, 7)]
+    assert get_missing_segments([], 10, 10) == [(0, 9)]
+    # Gaps between completed ranges are split on their own, completed ranges come in any order
+    assert get_missing_segments([(6, 7), (0, 1)], 10, 3) == [(2, 4), (5, 5), (8, 9)]
+    assert get_missing_segments([(0, 4), (5, 9)], 10, 4) == []
+
+def test_single_connection_fetches_bounded_ranges_in_order(config, stream_server):
+    data = write_file(stream_server, 'video.mp4', SEGMENT_SIZE * 8 + 123)
+    assert download(stream_server, 'video.mp4', 1) == data
+    # No request asks for more than a segment, googlevideo throttles larger ranges
+    assert [byte_range for _, byte_range in stream_server.requests] == [f'{start}-{min(start + SEGMENT_SIZE, len(data)) - 1}' for start in range(0, len(data), SEGMENT_SIZE)]
+    assert not os.path.exists(os.path.join(stream_server.root, 'video.mp4.out.part.json'))
+
+def test_default_segment_size_matches_pytubefix(config):
+    import pytubefix.request
+    from pytubepp.config import DEFAULT_CONFIG
+    assert DEFAULT_CONFIG['segmentSize'] <= pytubefix.request.default_range_size
+
+def test_segments_are_reassembled_in_place(config, stream_server):
+    data = write_file(stream_server, 'video.mp4', SEGMENT_SIZE * 8 + 123)
+    assert download(stream_server, 'video.mp4', 4) == data
+    assert sorted(int(byte_range.split('-')[0]) for _, byte_range in stream_server.requests) == [SEGMENT_SIZE * index for index in range(9)]
+
+def test_dropped_connections_are_retried(config, stream_server):
+    data = write_file(stream_server, 'video.mp4', SEGMENT_SIZE * 8 + 123)
+    stream_server.drop_connections = 3
+    assert download(stream_server, 'video.mp4', 4) == data
+    assert len(stream_server.requests) == 9 + 3
+
+def test_interrupted_download_is_resumed(config, stream_server, monkeypatch):
+    import requests
+    import pytubepp.download
+    data = write_file(stream_server, 'video.mp4', SEGMENT_SIZE * 8)
+    http_get, calls = pytubepp.download.http_get, []
+
+    def failing_http_get(*args, **kwargs):
+        # The connection goes away for good after 4 of the 8 segments
+        calls.append(args)
+        if len(calls) > 4:
+            raise requests.ConnectionError('Connection lost')
+        return http_get(*args, **kwargs)
+
+    monkeypatch.setattr(pytubepp.download, 'http_get', failing_http_get)
+    with pytest.raises(requests.ConnectionError):
+        download(stream_server, 'video.mp4', 1, max_retries=0)
+    monkeypatch.setattr(pytubepp.download, 'http_get', http_get)
+    assert download(stream_server, 'video.mp4', 2) == data
+    assert sorted(byte_range for _, byte_range in stream_server.requests[4:]) == [f'{SEGMENT_SIZE * index}-{SEGMENT_SIZE * (index + 1) - 1}' for index in range(4, 8)]
+
+def test_interrupt_stops_every_transfer(config, stream_server, tmp_path, monkeypatch):
+    import pytubepp.download
+    from pytubepp.download import download_nonprogressive
+    for name in ['video.mp4', 'audio.mp4']:
+        write_file(stream_server, name, SEGMENT_SIZE * 64)
+    streams = FakeStreamQuery([FakeStream(stream_server.url, os.path.join(stream_server.root, 'video.mp4'), 136, '720p'),
+                               FakeStream(stream_server.url, os.path.join(stream_server.root, 'audio.mp4'), 140)])
+    monkeypatch.setitem(config, 'segmentSize', SEGMENT_SIZE)
+    # Every chunk takes a while, like a rate limited download, and the main thread is interrupted (Ctrl+C) early on
+    monkeypatch.setattr(pytubepp.download, 'throttle', lambda amount: time.sleep(0.02))
+    threading.Timer(0.2, os.kill, (os.getpid(), signal.SIGINT)).start()
+    with pytest.raises(KeyboardInterrupt):
+        download_nonprogressive(streams, 136, 140, 'mp4', str(tmp_path), connections=2, video_id='video000000')
+    requested = len(stream_server.requests)
+    time.sleep(0.5)
+    # Only segments that were already starting may still go out
+    assert len(stream_server.requests) <= requested + 4
+    assert len(stream_server.requests) < 128
+    assert os.path.isfile(str(tmp_path / 'video000000_136_vdo.mp4.part.json'))
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os, signal, threading, time
+import pytest
+
+from conftest import requires_ffmpeg, make_audio, make_video, fake_youtube
+
+def test_failed_items_leave_the_pipeline(config):
+    from pytubepp.pipeline import run_pipeline
+    done, failed = [], []
+
+    def check(item):
+        if item % 3 == 0:
+            raise ValueError(f'bad item {item}')
+        return item
+
+    run_pipeline(range(10), [('double', lambda item: item * 2, 2, 0), ('check', check, 2, 1), ('done', lambda item: item, 1, 1)],
+                 done.append, lambda item, error: failed.append(str(error)))
+    assert sorted(done) == [2, 4, 8, 10, 14, 16]
+    assert sorted(failed) == ['bad item 0', 'bad item 12', 'bad item 18', 'bad item 6']
+
+def test_slow_stage_holds_back_earlier_stages(config):
+    from pytubepp.pipeline import run_pipeline
+    lock = threading.Lock()
+    fetched, in_flight = [0], []
+
+    def fetch(item):
+        with lock:
+            fetched[0] += 1
+        return item
+
+    def mux(item):
+        time.sleep(0.02)
+        with lock:
+            fetched[0] -= 1
+            in_flight.append(fetched[0] + 1)
+        return item
+
+    # At most 2 fetching + 1 queued + 1 muxing items exist at once
+    run_pipeline(range(20), [('fetch', fetch, 2, 0), ('mux', mux, 1, 1)], lambda item: None, lambda item, error: None)
+    assert max(in_flight) <= 4
+
+def test_interrupt_stops_the_workers(config):
+    from pytubepp.pipeline import run_pipeline
+    from pytubepp.download import check_cancelled, DownloadCancelled
+    started, stopped = [], []
+
+    def transfer(item):
+        started.append(item)
+        try:
+            for _ in range(100):
+                check_cancelled()
+                time.sleep(0.01)
+        except DownloadCancelled:
+            stopped.append(item)
+            raise
+        return item
+
+    threading.Timer(0.2, os.kill, (os.getpid(), signal.SIGINT)).start()
+    with pytest.raises(KeyboardInterrupt):
+        run_pipeline(range(10), [('transfer', transfer, 2, 0)], lambda item: None, lambda item, error: None)
+    time.sleep(0.1)
+    assert len(started) == 2 and sorted(stopped) == sorted(started)
+
+@requires_ffmpeg
+def test_concurrent_downloads_get_their_own_progress_rows(config, stream_server, monkeypatch):
+    import tqdm
+    import pytubepp.download
+    from pytubepp.main import YouTubeDownloader
+    from pytubepp.pipeline import download_videos_pipelined
+    video_file, audio_file = os.path.join(stream_server.root, 'video.mp4'), os.path.join(stream_server.root, 'audio.mp4')
+    make_video(video_file)
+    make_audio(audio_file)
+    monkeypatch.setattr('pytubefix.YouTube', fake_youtube(stream_server.url, [
+        {'file_path': video_file, 'itag': 136, 'resolution': '720p'},
+        {'file_path': audio_file, 'itag': 140, 'mime_type': 'audio/mp4', 'abr': '128kbps'}
+    ]))
+    # Slow transfers, so the downloads of both workers overlap
+    monkeypatch.setattr(pytubepp.download, 'throttle', lambda amount: time.sleep(0.05))
+    lock = threading.Lock()
+    open_bars, clashes, labels = {}, [], set()
+
+    class RecordingBar(tqdm.tqdm):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            with lock:
+                if kwargs['position'] in open_bars.values():
+                    clashes.append(kwargs['desc'])
+                open_bars[id(self)] = kwargs['position']
+                labels.add(kwargs['desc'].split(':')[0])
+
+        def close(self):
+            with lock:
+                open_bars.pop(id(self), None)
+            super().close()
+
+    monkeypatch.setattr(tqdm, 'tqdm', RecordingBar)
+    downloader = YouTubeDownloader()
+    downloader.environment_checked = True
+    urls = [f'https://www.youtube.com/watch?v=video{index:06d}' for index in range(4)]
+    results = download_videos_pipelined(downloader, urls, 2, '720p')
+    assert [result[3] for result in results] == ['Done'] * 4
+    assert clashes == []
+    assert labels == {url[-11:] for url in urls}
\ No newline at end of file
@@ -0,0 +1,47 @@
+import os, subprocess
+import pytest
+
+from conftest import requires_ffmpeg, make_audio, make_video, FakeStream, FakeStreamQuery
+
+def probe(file_path):
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-i', file_path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return result.stderr.splitlines()
+
+def get_streams(file_path):
+    return [line.split(': ')[1] for line in probe(file_path) if line.strip().startswith('Stream #')]
+
+def get_tags(file_path):
+    # Tags of the file itself, listed before its first stream
+    lines = probe(file_path)
+    start = next(index for index, line in enumerate(lines) if line.startswith('Input #')) + 2
+    return {line.split(':')[0].strip(): line.split(':', 1)[1].strip() for line in lines[start:] if line.startswith('    ') and not line.startswith('     ')}
+
+@requires_ffmpeg
+@pytest.mark.parametrize('fragmented', [True, False])
+def test_stream_merge_output_has_both_streams(config, stream_server, fragmented):
+    from pytubepp.postprocess import stream_merge_audio_video
+    video_file, audio_file = os.path.join(stream_server.root, 'video.mp4'), os.path.join(stream_server.root, 'audio.mp4')
+    # Without fragments the index comes last, ffmpeg can't read such streams from a pipe and writes an incomplete file
+    make_video(video_file, duration=3, fragmented=fragmented)
+    make_audio(audio_file, duration=3, fragmented=fragmented)
+    streams = FakeStreamQuery([FakeStream(stream_server.url, video_file, 136, '720p'), FakeStream(stream_server.url, audio_file, 140)])
+    output_file = stream_merge_audio_video(streams, 136, 140, 'Title', '720p', 'mp4', {}, None, config['stagingDIR'], config['downloadDIR'], 2, 'video000000')
+
+    assert os.listdir(config['downloadDIR']) == ['Title_720p.mp4']
+    assert sorted(get_streams(output_file)) == ['Audio', 'Video']
+    assert os.path.getsize(output_file) > (os.path.getsize(video_file) + os.path.getsize(audio_file)) // 2
+    assert os.listdir(config['stagingDIR']) == []
+    if fragmented:
+        # Merged straight from the pipes, nothing is downloaded a second time
+        assert sorted(path for path, _ in stream_server.requests) == ['/audio.mp4', '/video.mp4']
+
+@requires_ffmpeg
+def test_mp3_only_carries_its_own_tags(tmp_path):
+    from pytubepp.postprocess import get_mp3_output_args
+    audio_file, cover_file, output_file = str(tmp_path / 'audio.mp4'), str(tmp_path / 'cover.jpg'), str(tmp_path / 'audio.mp3')
+    make_audio(audio_file)
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x240', '-frames:v', '1', cover_file], check=True)
+    subprocess.run(['ffmpeg', '-v', 'error', '-i', audio_file, '-i', cover_file] + get_mp3_output_args('Artist', 'Title', 'Album') + [output_file], check=True)
+    # No major_brand, minor_version, compatible_brands or encoder tags
+    assert get_tags(output_file) == {'title': 'Title', 'artist': 'Artist', 'album': 'Album'}
+    assert [stream.split(',')[0] for stream in get_streams(output_file)] == ['Audio', 'Video']
\ No newline at end of file
@@ -0,0 +1,104 @@
+import http.client, json, threading, time
+import pytest
+
+@pytest.fixture
+def daemon(config):
+    from http.server import ThreadingHTTPServer
+    from pytubepp.main import YouTubeDownloader
+    from pytubepp.serve import JobQueue, make_handler
+    queue = JobQueue(YouTubeDownloader(), 1)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(queue))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield queue, server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    queue.executor.shutdown(wait=False)
+
+def post(port, body, content_length=None, content_type='application/json', host=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    connection.putrequest('POST', '/jobs', skip_host=host is not None)
+    if host is not None:
+        connection.putheader('Host', host)
+    connection.putheader('Content-Type', content_type)
+    connection.putheader('Content-Length', str(len(body)) if content_length is None else content_length)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read())
+    connection.close()
+    return result
+
+@pytest.mark.parametrize('body, content_length', [
+    (b'{"url": "https://youtu.be/dQw4w9WgXcQ"}', 'abc'),
+    (b'{"url": "https://youtu.be/dQw4w9WgXcQ"}', '-1'),
+    (b'{"url": ', None),
+    (b'\xff\xfe', None),
+    (b'["https://youtu.be/dQw4w9WgXcQ"]', None),
+    (b'{"url": 42}', None)
+])
+def test_malformed_requests_are_rejected(daemon, body, content_length):
+    queue, port = daemon
+    status, response = post(port, body, content_length)
+    assert status == 400 and 'error' in response
+    assert queue.jobs == {}
+
+def test_finished_jobs_are_forgotten(daemon):
+    queue, port = daemon
+    queue.job_ttl, queue.max_jobs = 60, 3
+    now = time.time()
+    for job_id, finished in [('1', now - 120), ('2', now - 30), ('3', now - 20), ('4', now - 10), ('5', None), ('6', None)]:
+        queue.jobs[job_id] = ({'id': job_id, 'type': 'info', 'url': '', 'status': 'queued' if finished is None else 'done', 'finished': finished}, threading.Event())
+    # Expired first, then the oldest finished ones over the cap, running and queued jobs are always kept
+    assert [job['id'] for job in queue.list()] == ['4', '5', '6']
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    connection.request('GET', '/jobs/1')
+    assert connection.getresponse().status == 404
+    connection.close()
+
+@pytest.mark.parametrize('content_type, host, status', [
+    # A form or text/plain POST needs no CORS preflight, any web page could send it
+    ('text/plain', None, 415),
+    ('application/x-www-form-urlencoded', None, 415),
+    # DNS rebinding: a web page's own domain resolving to 127.0.0.1
+    ('application/json', 'attacker.example:{port}', 403)
+])
+def test_requests_from_web_pages_are_rejected(daemon, content_type, host, status):
+    queue, port = daemon
+    assert post(port, b'{"url": "https://youtu.be/dQw4w9WgXcQ"}', content_type=content_type, host=host and host.format(port=port))[0] == status
+    assert queue.jobs == {}
+
+def test_same_download_is_queued_once(daemon, monkeypatch):
+    from pytubepp.serve import JobQueue
+    queue, port = daemon
+    # Jobs stay queued
+    monkeypatch.setattr(JobQueue, 'run', lambda self, job, event: None)
+    body = b'{"url": "https://youtu.be/dQw4w9WgXcQ", "stream": "720p"}'
+    first_status, first = post(port, body, host=f'localhost:{port}')
+    second_status, second = post(port, b'{"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "stream": "720p"}')
+    assert (first_status, second_status) == (201, 200) and first['id'] == second['id']
+    assert post(port, b'{"url": "https://youtu.be/dQw4w9WgXcQ", "stream": "mp3"}')[0] == 201
+    assert len(queue.jobs) == 2
+
+def test_downloads_of_a_video_run_one_at_a_time(config, monkeypatch):
+    from pytubepp.main import YouTubeDownloader
+    from pytubepp.serve import JobQueue
+    lock = threading.Lock()
+    running, most_running = {}, {}
+
+    def batch_download(self, link, stream=None, caption=None):
+        video_id = link[-11:]
+        with lock:
+            running[video_id] = running.get(video_id, 0) + 1
+            most_running[video_id] = max(most_running.get(video_id, 0), running[video_id])
+        time.sleep(0.1)
+        with lock:
+            running[video_id] -= 1
+        return stream, caption, None
+
+    monkeypatch.setattr(YouTubeDownloader, 'batch_download', batch_download)
+    queue = JobQueue(YouTubeDownloader(), 4)
+    for url, stream in [('https://youtu.be/dQw4w9WgXcQ', '720p'), ('https://youtu.be/dQw4w9WgXcQ', 'mp3'), ('https://youtu.be/aaaaaaaaaaa', '720p'), ('https://youtu.be/aaaaaaaaaaa', 'mp3')]:
+        queue.submit('download', url, stream)
+    queue.executor.shutdown(wait=True)
+    assert [job['status'] for job, _ in queue.jobs.values()] == ['done'] * 4
+    assert most_running == {'dQw4w9WgXcQ': 1, 'aaaaaaaaaaa': 1}
\ No newline at end of file
@@ -0,0 +1,31 @@
+SRT = '\ufeff1\r\n00:00:01,000 --> 00:00:02,500\r\nHello, world\r\n\r\n2\r\n01:02:03,040 --> 01:02:04,000\r\nSecond line\r\nwith a comma, 00:00:05,000\r\n'
+
+class FakeCaption:
+    def __init__(self, srt_text):
+        self.srt_text = srt_text
+        self.fetches = 0
+
+    def generate_srt_captions(self):
+        self.fetches += 1
+        return self.srt_text
+
+def test_srt_to_vtt():
+    from pytubepp.subtitles import srt_to_vtt
+    # Only the timing lines change, the comma in a cue text is kept
+    assert srt_to_vtt(SRT) == ('WEBVTT\n\n'
+                               '1\n00:00:01.000 --> 00:00:02.500\nHello, world\n\n'
+                               '2\n01:02:03.040 --> 01:02:04.000\nSecond line\nwith a comma, 00:00:05,000\n')
+
+def test_caption_tracks_are_cached(config):
+    from pytubepp.subtitles import get_caption_srt
+    english, spanish = FakeCaption(SRT), FakeCaption('1\n00:00:01,000 --> 00:00:02,000\nHola\n')
+    assert get_caption_srt(english, 'en', 'video000000') == SRT
+    assert get_caption_srt(english, 'en', 'video000000') == SRT
+    assert english.fetches == 1
+    # Other caption codes and videos have their own entries
+    assert get_caption_srt(spanish, 'es', 'video000000') == spanish.srt_text
+    assert get_caption_srt(english, 'en', 'video000001') == SRT
+    assert (english.fetches, spanish.fetches) == (2, 1)
+    # Nothing to key the cache on without a video id
+    get_caption_srt(english, 'en')
+    assert english.fetches == 3
\ No newline at end of file
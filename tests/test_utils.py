@@ -0,0 +1,52 @@
+import pytest
+
+@pytest.mark.parametrize('url, video_id', [
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'dQw4w9WgXcQ'),
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL0123456789', 'dQw4w9WgXcQ'),
+    ('https://music.youtube.com/watch?v=dQw4w9WgXcQ', 'dQw4w9WgXcQ'),
+    ('https://youtube.com/shorts/a-b_c1234XY?feature=share', 'a-b_c1234XY'),
+    ('https://youtu.be/dQw4w9WgXcQ?si=abc', 'dQw4w9WgXcQ'),
+    ('https://youtu.be/dQw4w9WgXcQ/', 'dQw4w9WgXcQ'),
+    # Video ids name files, nothing else may get through
+    ('https://youtu.be/../../../etc/passwd', None),
+    ('https://youtube.com/shorts/../../x', None),
+    ('https://youtube.com/shorts/abc/../../x', None),
+    ('https://www.youtube.com/watch?v=../../../../x', None),
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQQ', None),
+    ('https://youtu.be/', None),
+    ('https://youtu.be/dQw4w9WgXc', None)
+])
+def test_video_id(url, video_id):
+    from pytubepp.utils import get_video_id, is_valid_url
+    assert get_video_id(url) == video_id
+    assert bool(is_valid_url(url)) == (video_id is not None)
+
+def test_failed_update_check_is_not_retried(config, monkeypatch):
+    import requests
+    import pytubepp.session, pytubepp.utils
+    from pytubepp.utils import check_update
+    monkeypatch.setitem(config, 'updateCheck', True)
+    monkeypatch.delenv('PYTUBEPP_NO_UPDATE_CHECK', raising=False)
+    lookups = []
+
+    def offline_http_get(url, **kwargs):
+        lookups.append(url)
+        raise requests.ConnectionError('Network is unreachable')
+
+    class Thread:
+        # Runs the background lookup right away
+        def __init__(self, target, daemon=None):
+            self.target = target
+
+        def start(self):
+            self.target()
+
+    monkeypatch.setattr(pytubepp.session, 'http_get', offline_http_get)
+    monkeypatch.setattr(pytubepp.utils.threading, 'Thread', Thread)
+    assert check_update()[0] is False
+    assert check_update()[0] is False
+    assert len(lookups) == 1
+    # Retried once updateCheckInterval has passed
+    monkeypatch.setitem(config, 'updateCheckInterval', -1)
+    check_update()
+    assert len(lookups) == 2
\ No newline at end of file